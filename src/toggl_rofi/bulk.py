@@ -0,0 +1,81 @@
+"""
+Bulk actions on many time entries at once, for multi-selections in the track menu.
+
+Requests run a few at a time through a BoundedExecutor. Bulk actions aren't
+journalled, the result says which entries succeeded, and why the rest failed.
+"""
+import asyncio
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterable, TypeVar
+
+if TYPE_CHECKING:
+    from .store import EntryRecord
+
+
+# Requests in flight at once, unless configured otherwise
+DEFAULT_CONCURRENCY = 4
+# Most entries the API takes in a single bulk PATCH
+MAX_BATCH = 100
+
+T = TypeVar('T')
+
+
+class BoundedExecutor:
+    """
+    Runs coroutines with at most `limit` of them in flight.
+    """
+    def __init__(self, limit: int = DEFAULT_CONCURRENCY):
+        self.limit = max(1, limit)
+        self._semaphore = asyncio.Semaphore(self.limit)
+
+    async def run(self, coro: Awaitable[T]) -> T:
+        async with self._semaphore:
+            return await coro
+
+    async def map(self, func: Callable[[Any], Awaitable[T]], items: Iterable) -> list[tuple[Any, T | Exception]]:
+        """
+        Call `func` on every item, returning each item with its result,
+        or the exception it raised, in the order given.
+        """
+        items = list(items)
+        results = await asyncio.gather(*(self.run(func(item)) for item in items), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                # e.g. cancelled, not a failure of the item
+                raise result
+        return list(zip(items, results))
+
+
+class BulkResult:
+    """
+    How a bulk action went for each of its entries.
+    """
+    verbs = {
+        'stop': "Stopped",
+        'delete': "Deleted",
+        'update': "Updated",
+        'duplicate': "Duplicated",
+    }
+
+    def __init__(self, op: str):
+        self.op = op
+        self.succeeded: list['EntryRecord'] = []
+        # Entries with the reason they failed
+        self.failed: list[tuple['EntryRecord', str]] = []
+
+    def __len__(self):
+        return len(self.succeeded) + len(self.failed)
+
+    def __repr__(self):
+        return f"<BulkResult {self.op} {len(self.succeeded)} succeeded {len(self.failed)} failed>"
+
+    def succeed(self, entry: 'EntryRecord'):
+        self.succeeded.append(entry)
+
+    def fail(self, entry: 'EntryRecord', message: str):
+        self.failed.append((entry, message))
+
+    def summary(self) -> str:
+        text = f"{self.verbs.get(self.op, self.op)} {len(self.succeeded)} of {len(self)} entries"
+        if self.failed:
+            text += f", {len(self.failed)} failed"
+        return text
@@ -1,7 +1,18 @@
-from typing import Optional
+from typing import Iterable, Optional
+import asyncio
+import datetime as dt
+import logging
 import re
 
-from toggl_track import Project, Tag, TrackClient
+from . import tracing
+from .bulk import DEFAULT_CONCURRENCY, MAX_BATCH, BoundedExecutor, BulkResult
+from .journal import Journal
+from .lib import utc_now
+from .scheduler import BACKGROUND, DEFAULT_BURST, DEFAULT_RATE, DEFAULT_RETRIES, RequestScheduler, use_lane
+from .session import DEFAULT_DNS_TTL, DEFAULT_KEEPALIVE, HTTPSession
+from .store import EntryRecord, LocalState, ProjectRecord, TagRecord, load_time
+
+logger = logging.getLogger(__name__)
 
 entry_pattern = re.compile(
     r"(?P<desc>[^\@]*) \s* (?:\@(?P<proj>[^\#]*)) \s* (?P<tags>\#.*)?",
@@ -9,15 +20,29 @@ entry_pattern = re.compile(
 )
 
 class ParsedEntry:
-    def __init__(self, original: str, desc: Optional[str], project: Optional[str], tags: list[str] = []):
+    def __init__(self, original: str, desc: Optional[str], project: Optional[str], tags: list[str] = [],
+                 project_id: Optional[int] = None, tag_ids: Optional[dict[str, int]] = None):
         self.original = original
         self.desc = desc
         self.project = project
         self.tags = tags
+        # Records picked from a menu, so their names needn't be looked up again.
+        # Tags are keyed by casefolded name.
+        self.project_id = project_id
+        self.tag_ids = tag_ids if tag_ids is not None else {}
+
+    def keep_picks(self, previous: 'ParsedEntry'):
+        """
+        Keep the records picked for a previous version of this entry, for the names it still has.
+        """
+        if self.project and previous.project and self.project.casefold() == previous.project.casefold():
+            self.project_id = previous.project_id
+        names = {tag.casefold() for tag in self.tags}
+        self.tag_ids = {name: tagid for name, tagid in previous.tag_ids.items() if name in names}
 
     def format_for_edit(self):
         parts = []
-        parts.append(self.desc)
+        parts.append(self.desc or '')
         if project := self.project:
             parts.append(f"@{project}")
 
@@ -28,7 +53,601 @@ class ParsedEntry:
         return '    '.join(parts)
 
 
-class RofiTrackClient(TrackClient):
+class APIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class AmbiguousNameError(LookupError):
+    def __init__(self, kind: str, name: str, matches: list):
+        options = ', '.join(
+            f"{match.name} (workspace {match.workspace_id}"
+            + (f", client {match.client_id})" if getattr(match, 'client_id', None) else ")")
+            for match in matches
+        )
+        super().__init__(f"{kind} name '{name}' is ambiguous between: {options}")
+        self.kind = kind
+        self.name = name
+        self.matches = matches
+
+
+class RofiTrackClient:
+    """
+    Toggl Track v9 API client maintaining the local store the menus render from.
+    Makes its own requests, since toggl.py's TrackClient has no `since` or date range syncs.
+    """
+    api_base = 'https://api.track.toggl.com/api/v9'
+
+    # Toggl only accepts `since` cursors from the recent past
+    max_cursor_age = dt.timedelta(days=90)
+    # Margin for clock skew and requests in flight while we sync
+    cursor_overlap = dt.timedelta(minutes=5)
+    # Longest wait between attempts to flush the journal
+    max_flush_delay = 300
+
+    def __init__(self, apikey: Optional[str] = None, snapshot_path: Optional[str] = None,
+                 history_days: int = 30, journal_path: Optional[str] = None,
+                 api_base: Optional[str] = None,
+                 keepalive: float = DEFAULT_KEEPALIVE, dns_ttl: float = DEFAULT_DNS_TTL,
+                 concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE,
+                 burst: int = DEFAULT_BURST, retries: int = DEFAULT_RETRIES):
+        self.apikey = apikey
+        if api_base:
+            # e.g. a local stand-in server
+            self.api_base = api_base.rstrip('/')
+        self.snapshot_path = snapshot_path
+        # How much history a full sync loads, older pages are fetched on demand
+        self.history_window = dt.timedelta(days=history_days)
+
+        # Local state the menus render from, possibly loaded from the snapshot
+        self.store: Optional[LocalState] = None
+        # Actions applied to the store but not yet to the API
+        self.journal = Journal.load(journal_path) if journal_path is not None else Journal()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        # Set when an attempt to flush fails, until the next attempt
+        self._flush_failed = asyncio.Event()
+        # Shared by every request, so they reuse each other's connections
+        self.http = HTTPSession(apikey, keepalive=keepalive, dns_ttl=dns_ttl)
+        # Paces and retries every request, keeping us under the API's rate limit
+        self.scheduler = RequestScheduler(self.http, rate=rate, burst=burst, retries=retries)
+        # Limits the requests of bulk actions in flight at once
+        self.executor = BoundedExecutor(concurrency)
+
+    async def __aenter__(self) -> 'RofiTrackClient':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._flush_task is not None:
+            # Anything left is still in the journal for next time
+            self._flush_task.cancel()
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        stats = self.scheduler.stats()
+        tracing.mark('scheduler', **stats)
+        logger.debug("Request scheduler stats %s", stats)
+        await self.scheduler.close()
+        await self.http.close()
+
+    async def request(self, method: str, path: str, **kwargs):
+        """
+        Make a raw request against the v9 API, returning the decoded response.
+        Requests are paced and retried by the scheduler, see `scheduler.RequestScheduler.request`.
+        """
+        with tracing.span('api', method=method, path=path):
+            resp = await self.scheduler.request(method, self.api_base + path, **kwargs)
+        if resp.status >= 400:
+            raise APIError(resp.status, str(resp.data))
+        return resp.data
+
+    def load_snapshot(self) -> bool:
+        if self.snapshot_path is None:
+            return False
+        with tracing.span('snapshot.load'):
+            self.store = LocalState.load(self.snapshot_path)
+        if self.store is None:
+            return False
+        # The snapshot isn't rewritten for every action, the journal has them
+        self._apply_pending()
+        return True
+
+    def save_snapshot(self):
+        if self.snapshot_path is not None and self.store is not None:
+            with tracing.span('snapshot.save'):
+                self.store.save(self.snapshot_path)
+
+    async def fetch_entries(self, start: dt.datetime, end: dt.datetime) -> list[dict]:
+        """
+        Fetch the time entries started in the given range.
+        """
+        entries = await self.request('GET', '/me/time_entries', params={
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+        })
+        return entries or []
+
+    async def full_sync(self):
+        """
+        Rebuild the local store from scratch,
+        with the profile, every project and tag, and the recent history window.
+        """
+        started = utc_now()
+        history_start = started - self.history_window
+        me, projects, tags, entries = await asyncio.gather(
+            self.request('GET', '/me'),
+            self.request('GET', '/me/projects', params={'include_archived': 'true'}),
+            self.request('GET', '/me/tags'),
+            # Running entries may start in the future as far as a skewed clock is concerned
+            self.fetch_entries(history_start, started + dt.timedelta(days=1)),
+        )
+        store = LocalState(
+            profile_id=me['id'],
+            timezone=me['timezone'],
+            workspace_id=me['default_workspace_id'],
+            synced_at=started,
+            cursor=started - self.cursor_overlap,
+            history_start=history_start,
+        )
+        store.merge(projects=projects or [], tags=tags or [], time_entries=entries)
+        self.store = store
+
+    async def load_history(self, start: dt.datetime) -> int:
+        """
+        Extend the loaded history back to the given time.
+        Returns the number of entries fetched.
+        """
+        end = self.store.history_start
+        if end is None or start >= end:
+            return 0
+        entries = await self.fetch_entries(start, end)
+        self.store.merge(time_entries=entries)
+        self.store.history_start = start
+        self.save_snapshot()
+        return len(entries)
+
+    async def incremental_sync(self):
+        """
+        Fetch the entries, projects and tags changed since the store cursor,
+        and merge them into the store.
+        """
+        started = utc_now()
+        since = int(self.store.cursor.timestamp())
+        entries, projects, tags = await asyncio.gather(
+            self.request('GET', '/me/time_entries', params={'since': since}),
+            self.request('GET', '/me/projects', params={'since': since, 'include_archived': 'true'}),
+            self.request('GET', '/me/tags', params={'since': since}),
+        )
+        self.store.merge(projects=projects or [], tags=tags or [], time_entries=entries or [])
+        self.store.synced_at = started
+        self.store.cursor = started - self.cursor_overlap
+        logger.info(
+            "Incremental sync: %d entries, %d projects, %d tags changed.",
+            len(entries or []), len(projects or []), len(tags or []),
+        )
+
+    async def refresh(self, full=False):
+        """
+        Bring the local store up to date and rewrite the snapshot.
+        Syncs incrementally when the store has a usable cursor,
+        and falls back to a full sync otherwise.
+        """
+        cursor = self.store.cursor if self.store is not None else None
+        if full or cursor is None or utc_now() - cursor > self.max_cursor_age:
+            with tracing.span('sync', kind='full'):
+                await self.full_sync()
+        else:
+            try:
+                with tracing.span('sync', kind='incremental'):
+                    await self.incremental_sync()
+            except APIError as e:
+                if not 400 <= e.status < 500 or e.status in (401, 403, 429):
+                    raise
+                # The API refused our cursor
+                logger.warning("Incremental sync rejected (%s), running full sync.", e)
+                with tracing.span('sync', kind='full'):
+                    await self.full_sync()
+        # The API doesn't know about these yet
+        self._apply_pending()
+        self.save_snapshot()
+
+    def refresh_in_background(self) -> asyncio.Task:
+        """
+        Refresh without blocking the caller.
+        Used when the menus can already render from the snapshot.
+        """
+        async def _refresh():
+            # Behind anything the user is waiting on
+            use_lane(BACKGROUND)
+            await self.refresh()
+            logger.info("Background sync complete.")
+
+        self._refresh_task = asyncio.create_task(_refresh())
+        return self._refresh_task
+
+    async def wait_synced(self):
+        """
+        Wait for any background refresh, re-raising its failure.
+        """
+        if self._refresh_task is not None:
+            await self._refresh_task
+
+    async def start_time_entry(self, workspace_id: int, description: Optional[str],
+                               project_id: Optional[int] = None, tag_ids: list[int] = [],
+                               start: Optional[dt.datetime] = None) -> EntryRecord:
+        """
+        Start a new entry, returning its local record.
+        Any running entry is stopped locally, as the API will do.
+        The entry has a provisional negative id until the API has created it.
+        """
+        # Whole seconds, so the entry can be recognised on the server if we lose the response
+        start = (start or utc_now()).replace(microsecond=0)
+        action = self.journal.record(
+            'start',
+            entry_id=self._provisional_id(),
+            workspace_id=workspace_id,
+            description=description,
+            project_id=project_id,
+            tag_ids=list(tag_ids),
+            start=start.isoformat(),
+            # The API stops the running entry, these are restored if the start fails
+            previous=[entry.to_data() for entry in self._running_entries()],
+        )
+        return self._record_action(action)
+
+    async def stop_time_entry(self, entry: EntryRecord) -> EntryRecord:
+        action = self.journal.record(
+            'stop',
+            entry_id=entry.id,
+            workspace_id=entry.workspace_id,
+            description=entry.description,
+            stop=utc_now().replace(microsecond=0).isoformat(),
+            previous=[entry.to_data()],
+        )
+        return self._record_action(action)
+
+    async def continue_time_entry(self, entry: EntryRecord) -> EntryRecord:
+        return await self.start_time_entry(
+            entry.workspace_id, entry.description, project_id=entry.project_id, tag_ids=entry.tag_ids
+        )
+
+    def _sendable(self, entries: Iterable[EntryRecord], result: BulkResult) -> list[EntryRecord]:
+        """
+        The entries the API knows about, failing the rest.
+        """
+        sendable = []
+        for entry in entries:
+            if entry.id < 0:
+                result.fail(entry, "Not created on the server yet.")
+            else:
+                sendable.append(entry)
+        return sendable
+
+    async def bulk_stop(self, entries: Iterable[EntryRecord]) -> BulkResult:
+        """
+        Stop the running entries among those given, through the journal like a single stop.
+        """
+        result = BulkResult('stop')
+        for entry in entries:
+            if entry.running:
+                await self.stop_time_entry(entry)
+                result.succeed(entry)
+            else:
+                result.fail(entry, "Not running.")
+        return result
+
+    async def bulk_update(self, entries: Iterable[EntryRecord], changes: dict) -> BulkResult:
+        """
+        Set fields of many entries at once, e.g. `project_id` or `tag_ids`,
+        with a bulk PATCH for each batch of entries in a workspace.
+        """
+        result = BulkResult('update')
+        batches = []
+        workspaces: dict[int, list[EntryRecord]] = {}
+        for entry in self._sendable(entries, result):
+            workspaces.setdefault(entry.workspace_id, []).append(entry)
+        for wid, group in workspaces.items():
+            batches.extend((wid, group[i:i + MAX_BATCH]) for i in range(0, len(group), MAX_BATCH))
+        patch = [{'op': 'replace', 'path': f"/{field}", 'value': value} for field, value in changes.items()]
+
+        async def send(batch):
+            wid, group = batch
+            ids = ','.join(str(entry.id) for entry in group)
+            return await self.request('PATCH', f"/workspaces/{wid}/time_entries/{ids}", json=patch)
+
+        count = sum(len(group) for _, group in batches)
+        with tracing.span('bulk', op='update', count=count, batches=len(batches)):
+            for (_, group), response in await self.executor.map(send, batches):
+                if isinstance(response, Exception):
+                    for entry in group:
+                        result.fail(entry, str(response))
+                    continue
+                succeeded = set(response.get('success') or ())
+                failures = {failure['id']: failure.get('message', '') for failure in response.get('failure') or ()}
+                for entry in group:
+                    if entry.id in succeeded:
+                        self._update_record(entry, changes)
+                        result.succeed(entry)
+                    else:
+                        result.fail(entry, failures.get(entry.id) or "Not updated.")
+        self.save_snapshot()
+        return result
+
+    def _update_record(self, record: EntryRecord, changes: dict):
+        if 'project_id' in changes:
+            record.project_id = changes['project_id']
+        if 'tag_ids' in changes:
+            record.tag_ids = list(changes['tag_ids'])
+            record.tags = [self.store.tags[tagid].name for tagid in record.tag_ids if tagid in self.store.tags]
+        self.store.add_entry(record)
+
+    async def bulk_delete(self, entries: Iterable[EntryRecord]) -> BulkResult:
+        """
+        Delete many entries, a request each, since the API has no bulk delete.
+        """
+        result = BulkResult('delete')
+        sendable = self._sendable(entries, result)
+
+        async def send(entry):
+            return await self.request('DELETE', f"/workspaces/{entry.workspace_id}/time_entries/{entry.id}")
+
+        with tracing.span('bulk', op='delete', count=len(sendable)):
+            for entry, response in await self.executor.map(send, sendable):
+                if isinstance(response, APIError) and response.status == 404:
+                    # Already gone
+                    response = None
+                if isinstance(response, Exception):
+                    result.fail(entry, str(response))
+                else:
+                    self.store.remove_entry(entry.id)
+                    result.succeed(entry)
+        self.save_snapshot()
+        return result
+
+    async def bulk_duplicate(self, entries: Iterable[EntryRecord], day: dt.date, tz: dt.tzinfo) -> BulkResult:
+        """
+        Copy stopped entries to the given day, at the same time of day and for as long,
+        a request each, since the API has no bulk create.
+        """
+        result = BulkResult('duplicate')
+        sendable = []
+        for entry in entries:
+            if entry.running:
+                result.fail(entry, "Still running.")
+            else:
+                sendable.append(entry)
+
+        async def send(entry):
+            start = dt.datetime.combine(day, entry.start.astimezone(tz).timetz()).replace(microsecond=0)
+            duration = int((entry.stop - entry.start).total_seconds())
+            return await self.request('POST', f"/workspaces/{entry.workspace_id}/time_entries", json={
+                'workspace_id': entry.workspace_id,
+                'description': entry.description,
+                'project_id': entry.project_id,
+                'tag_ids': entry.tag_ids,
+                'start': start.isoformat(),
+                'stop': (start + dt.timedelta(seconds=duration)).isoformat(),
+                'duration': duration,
+                'created_with': 'toggl-rofi',
+            })
+
+        with tracing.span('bulk', op='duplicate', count=len(sendable)):
+            for entry, data in await self.executor.map(send, sendable):
+                if isinstance(data, Exception):
+                    result.fail(entry, str(data))
+                else:
+                    self.store.add_entry(EntryRecord.from_data(data))
+                    result.succeed(entry)
+        self.save_snapshot()
+        return result
+
+    def _provisional_id(self) -> int:
+        ids = [0, *(action['entry_id'] for action in self.journal.pending.values())]
+        if self.store is not None:
+            ids.append(min(self.store.time_entries, default=0))
+        return min(ids) - 1
+
+    def _running_entries(self) -> list[EntryRecord]:
+        if self.store is None:
+            return []
+        return [entry for entry in self.store.time_entries.values() if entry.running]
+
+    def _record_action(self, action: dict) -> Optional[EntryRecord]:
+        # The journal is enough to recover the action, the snapshot is saved once it is flushed
+        record = self._apply_action(action)
+        self.flush_in_background()
+        return record
+
+    def _apply_action(self, action: dict) -> Optional[EntryRecord]:
+        """
+        Apply a journalled action to the local store.
+        Safe to repeat, since pending actions are reapplied after every sync.
+        """
+        store = self.store
+        if store is None:
+            return None
+        if action['op'] == 'start':
+            start = load_time(action['start'])
+            for entry in self._running_entries():
+                if entry.id != action['entry_id'] and entry.start <= start:
+                    # Only one entry runs at a time, starting another stops it
+                    self._stop_record(entry, start)
+            tag_ids = action['tag_ids']
+            record = EntryRecord(
+                action['entry_id'], action['workspace_id'], action['project_id'], action['description'],
+                load_time(action['start']), None, -1,
+                [store.tags[tagid].name for tagid in tag_ids if tagid in store.tags], list(tag_ids), None,
+            )
+            store.add_entry(record)
+            return record
+        elif action['op'] == 'stop':
+            record = store.time_entries.get(action['entry_id'])
+            if record is not None and record.running:
+                self._stop_record(record, load_time(action['stop']))
+            return record
+
+    def _stop_record(self, record: EntryRecord, stop: dt.datetime):
+        record.stop = max(stop, record.start)
+        record.duration = int((record.stop - record.start).total_seconds())
+        self.store.add_entry(record)
+
+    def _rollback_action(self, action: dict, error: APIError):
+        """
+        Undo the local effects of an action the API refused.
+        """
+        store = self.store
+        if store is None:
+            return
+        if action['op'] == 'start':
+            store.remove_entry(action['entry_id'])
+        elif error.status == 404:
+            # The entry is gone from the server
+            store.remove_entry(action['entry_id'])
+            return
+        for data in action.get('previous', ()):
+            # Only the stop was changed locally, anything else may since have been synced
+            if (record := store.time_entries.get(data['id'])) is not None:
+                record.stop = load_time(data['stop'])
+                record.duration = data['duration']
+                store.add_entry(record)
+        # Later actions may have made changes of their own to the restored entries
+        self._apply_pending()
+
+    async def _reconcile_action(self, action: dict):
+        """
+        Fetch the server copies of entries the API changed as a side effect of an action.
+        """
+        if action['op'] != 'start' or self.store is None:
+            return
+        for data in action.get('previous', ()):
+            try:
+                data = await self.request('GET', f"/me/time_entries/{data['id']}")
+            except APIError as e:
+                # Left for the next sync to sort out
+                logger.warning("Could not reconcile entry %s: %s", data['id'], e)
+                continue
+            if data:
+                self.store.add_entry(EntryRecord.from_data(data))
+
+    def _apply_pending(self):
+        for action in self.journal.pending.values():
+            self._apply_action(action)
+
+    async def _send_action(self, action: dict, resend: bool = False) -> dict:
+        """
+        Replay a journalled action to the API, returning the resulting entry data.
+        """
+        wid = action['workspace_id']
+        if action['op'] == 'start':
+            if resend:
+                # A previous attempt may have reached the API before we lost it
+                if (data := await self._find_started(action)) is not None:
+                    return data
+            return await self.request('POST', f'/workspaces/{wid}/time_entries', json={
+                'workspace_id': wid,
+                'description': action['description'],
+                'project_id': action['project_id'],
+                'tag_ids': action['tag_ids'],
+                'start': action['start'],
+                'duration': -1,
+                'created_with': 'toggl-rofi',
+            })
+        elif action['op'] == 'stop':
+            # Set the recorded stop time, rather than whenever the journal happens to be flushed
+            return await self.request(
+                'PUT', f"/workspaces/{wid}/time_entries/{action['entry_id']}", json={'stop': action['stop']}
+            )
+        raise ValueError(f"Unknown journal action {action['op']}")
+
+    async def _find_started(self, action: dict) -> Optional[dict]:
+        start = load_time(action['start'])
+        entries = await self.fetch_entries(start - dt.timedelta(seconds=1), start + dt.timedelta(seconds=1))
+        for data in entries:
+            if (load_time(data['start']) == start and data['workspace_id'] == action['workspace_id']
+                    and data.get('description') == action['description']
+                    and data.get('project_id') == action['project_id']):
+                return data
+        return None
+
+    async def flush(self):
+        """
+        Send the pending journal actions to the API, in the order they were made.
+        Actions the API refuses are dropped and kept as conflicts to report.
+        Raises on the first failure worth retrying, leaving it and later actions pending.
+        The snapshot is saved once at the end, if any action was settled.
+        """
+        settled = False
+        try:
+            for action in list(self.journal.pending.values()):
+                if action['id'] not in self.journal.pending:
+                    continue
+                if action['entry_id'] < 0 and action['op'] != 'start':
+                    # The start it depends on was refused
+                    self.journal.conflict(action, "The entry was never created.")
+                    continue
+
+                resend = action.get('sent', False)
+                self.journal.sending(action)
+                try:
+                    with tracing.span('mutation', op=action['op'], resend=resend):
+                        data = await self._send_action(action, resend)
+                except APIError as e:
+                    if 400 <= e.status < 500 and e.status not in (401, 403, 408, 429):
+                        logger.warning("Journal action %s on %s refused: %s", action['op'], action['entry_id'], e)
+                        self.journal.conflict(action, str(e))
+                        self._rollback_action(action, e)
+                        settled = True
+                        continue
+                    raise
+
+                # Replace the provisional record with the server copy
+                if self.store is not None:
+                    if data['id'] != action['entry_id']:
+                        self.store.remove_entry(action['entry_id'])
+                    self.store.add_entry(EntryRecord.from_data(data))
+                self.journal.done(action, data['id'])
+                settled = True
+                await self._reconcile_action(action)
+                self._apply_pending()
+        finally:
+            if settled:
+                self.save_snapshot()
+
+    async def _flush_loop(self):
+        delay = 1
+        while self.journal:
+            try:
+                self._flush_failed.clear()
+                await self.flush()
+            except Exception as e:
+                logger.warning("Could not flush journal (%r), retrying in %ss.", e, delay)
+                self._flush_failed.set()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_flush_delay)
+
+    def flush_in_background(self) -> Optional[asyncio.Task]:
+        """
+        Start flushing the journal, retrying with backoff until it is empty.
+        """
+        if self.journal and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        return self._flush_task
+
+    async def wait_flushed(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait up to `timeout` seconds for the journal to be flushed,
+        giving up early if an attempt fails, e.g. when offline.
+        Returns whether everything reached the API.
+        """
+        if self._flush_task is not None and not self._flush_task.done():
+            failed = asyncio.create_task(self._flush_failed.wait())
+            await asyncio.wait([self._flush_task, failed], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            failed.cancel()
+        return not self.journal
+
     def parse_entry(self, userstr: str) -> ParsedEntry | None:
         match = re.match(entry_pattern, userstr)
         if match:
@@ -40,15 +659,43 @@ class RofiTrackClient(TrackClient):
         else:
             return None
 
-    def get_project_by_name(self, project_name: str) -> Project | None:
-        matching = (
-            p for p in self.state.projects.values() if p.name.lower() == project_name.lower()
-        )
-        return next(matching, None)
+    def get_project_by_name(self, project_name: str, workspace_id: Optional[int] = None) -> ProjectRecord | None:
+        """
+        Find a project by case-insensitive name, optionally within a single workspace.
+        Raises AmbiguousNameError if more than one project has this name.
+        """
+        matching = self.store.find_projects(project_name, workspace_id)
+        if len(matching) > 1:
+            raise AmbiguousNameError('Project', project_name, matching)
+        return next(iter(matching), None)
 
-    def get_tag_by_name(self, tagstr: str) -> Tag | None:
-        tag = next(
-            (tag for tag in self.state.tags.values() if tag.name.lower() == tagstr.lower()),
-            None
-        )
-        return tag
+    def get_tag_by_name(self, tagstr: str, workspace_id: Optional[int] = None) -> TagRecord | None:
+        """
+        Find a tag by case-insensitive name, optionally within a single workspace.
+        Raises AmbiguousNameError if more than one tag has this name.
+        """
+        matching = self.store.find_tags(tagstr, workspace_id)
+        if len(matching) > 1:
+            raise AmbiguousNameError('Tag', tagstr, matching)
+        return next(iter(matching), None)
+
+    def resolve_names(self, parsed: ParsedEntry) -> tuple[Optional[int], list[int]]:
+        """
+        Resolve the project and tag names of a parsed entry to ids, unless they were picked.
+        Unknown names are skipped, ambiguous names raise AmbiguousNameError.
+        """
+        projectid = parsed.project_id
+        if projectid is None and parsed.project:
+            project = self.get_project_by_name(parsed.project)
+            if project:
+                projectid = project.id
+
+        tag_ids = []
+        for tagstr in parsed.tags:
+            if (tagid := parsed.tag_ids.get(tagstr.casefold())) is not None:
+                tag_ids.append(tagid)
+                continue
+            tag = self.get_tag_by_name(tagstr)
+            if tag:
+                tag_ids.append(tag.id)
+        return projectid, tag_ids
@@ -0,0 +1,185 @@
+"""
+Ranked completion of project and tag names.
+
+Names are indexed by the start of each word, and matches ranked by how well
+they match, then by frecency: how often and how recently entries used the name.
+"""
+import heapq
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Hashable, Iterable, Optional
+
+
+# Days for an entry's weight to halve
+HALF_LIFE = 14
+# Fixed reference for the weights, so they never need rescaling as time passes
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()
+
+word_pattern = re.compile(r"\w+")
+
+# Matches returned by a query, enough for a screenful or two of rofi
+DEFAULT_LIMIT = 50
+
+# How well a name matches a query, best first
+EXACT, PREFIX, WORDS, SUBSTRING = range(4)
+
+
+def frecency_weight(start: datetime) -> float:
+    return 2.0 ** ((start.timestamp() - EPOCH) / (HALF_LIFE * 86400))
+
+
+class CompletionIndex:
+    def __init__(self):
+        # key -> record, and its casefolded name
+        self.records: dict[Hashable, Any] = {}
+        self.names: dict[Hashable, str] = {}
+        # key -> frecency, kept for keys whose record is replaced
+        self.scores: defaultdict[Hashable, float] = defaultdict(float)
+        # key -> entries using it, so a score is dropped exactly when its last use goes
+        self.use_counts: defaultdict[Hashable, int] = defaultdict(int)
+        # What each entry added to the scores, so it can be taken away again
+        self.uses: dict[int, tuple[tuple[Hashable, ...], float]] = {}
+        # Sorted (word, key) pairs, for each word of each name
+        self._words: list[tuple[str, Hashable]] = []
+        # Pairs added since the last query, merged in on the next
+        self._pending: list[tuple[str, Hashable]] = []
+        # Every key by descending score, for empty queries
+        self._ranked: Optional[list[Hashable]] = None
+        # Every name joined into one string, with the offset and key of each,
+        # so matches inside words can be found without a Python loop over the names
+        self._haystack: Optional[tuple[str, list[int], list[Hashable]]] = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, key: Hashable, name: str, record: Any):
+        self.remove(key)
+        folded = name.casefold()
+        self.records[key] = record
+        self.names[key] = folded
+        self._pending.extend((word, key) for word in set(word_pattern.findall(folded)))
+        self._ranked = None
+        self._haystack = None
+
+    def remove(self, key: Hashable):
+        folded = self.names.pop(key, None)
+        if folded is None:
+            return
+        del self.records[key]
+        self._merge()
+        for word in set(word_pattern.findall(folded)):
+            i = bisect_left(self._words, (word, key))
+            if i < len(self._words) and self._words[i] == (word, key):
+                del self._words[i]
+        self._ranked = None
+        self._haystack = None
+
+    def add_use(self, entryid: int, keys: Iterable[Hashable], weight: float):
+        """
+        Count an entry's use of the given keys, replacing anything it counted before.
+        """
+        self.remove_use(entryid)
+        keys = tuple(keys)
+        if not keys:
+            return
+        for key in keys:
+            self.scores[key] += weight
+            self.use_counts[key] += 1
+        self.uses[entryid] = (keys, weight)
+        self._ranked = None
+
+    def remove_use(self, entryid: int):
+        keys, weight = self.uses.pop(entryid, ((), 0))
+        for key in keys:
+            self.use_counts[key] -= 1
+            if self.use_counts[key] <= 0:
+                # Rather than leave rounding error behind
+                del self.use_counts[key]
+                del self.scores[key]
+            else:
+                self.scores[key] -= weight
+        if keys:
+            self._ranked = None
+
+    def _merge(self):
+        if self._pending:
+            if len(self._pending) < 64:
+                for pair in self._pending:
+                    insort(self._words, pair)
+            else:
+                self._words.extend(self._pending)
+                self._words.sort()
+            self._pending.clear()
+
+    def ranked(self) -> list[Hashable]:
+        if self._ranked is None:
+            self._ranked = sorted(self.records, key=lambda key: self.scores.get(key, 0), reverse=True)
+        return self._ranked
+
+    def _prefixed(self, token: str) -> set[Hashable]:
+        """
+        Keys of the names with a word starting with the token.
+        """
+        words = self._words
+        start = bisect_left(words, (token,))
+        end = bisect_left(words, (token + '\U0010ffff',), start)
+        return {key for _, key in words[start:end]}
+
+    def _containing(self, token: str) -> set[Hashable]:
+        """
+        Keys of the names containing the token anywhere.
+        """
+        if self._haystack is None:
+            offsets = []
+            keys = []
+            offset = 0
+            for key, name in self.names.items():
+                offsets.append(offset)
+                keys.append(key)
+                offset += len(name) + 1
+            self._haystack = ('\n'.join(self.names.values()), offsets, keys)
+        haystack, offsets, keys = self._haystack
+
+        found = set()
+        i = haystack.find(token)
+        while i >= 0:
+            n = bisect_right(offsets, i) - 1
+            found.add(keys[n])
+            # On to the next name
+            i = haystack.find(token, offsets[n + 1]) if n + 1 < len(offsets) else -1
+        return found
+
+    def query(self, text: str, limit: int = DEFAULT_LIMIT) -> list[Any]:
+        """
+        The records best matching the text, best first.
+        Every word of the text has to start a word of the name, or failing that appear inside it.
+        """
+        text = text.casefold().strip()
+        tokens = word_pattern.findall(text)
+        if not tokens:
+            return [self.records[key] for key in self.ranked()[:limit]]
+
+        self._merge()
+        names = self.names
+        scores = self.scores
+        keys = None
+        for token in sorted(set(tokens), key=len, reverse=True):
+            prefixed = self._prefixed(token)
+            keys = prefixed if keys is None else keys & prefixed
+            if not keys:
+                break
+
+        # Only names starting with the whole query can match better than WORDS
+        matches = [
+            (-(EXACT if names[key] == text else PREFIX if names[key].startswith(text) else WORDS),
+             scores.get(key, 0), key)
+            for key in keys
+        ]
+        if len(matches) < limit:
+            # Not enough names with words starting with the query, look inside words too
+            for key in self._containing(max(tokens, key=len)) - keys:
+                if all(token in names[key] for token in tokens):
+                    matches.append((-SUBSTRING, scores.get(key, 0), key))
+        return [self.records[key] for _, _, key in heapq.nlargest(limit, matches)]
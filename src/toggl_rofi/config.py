@@ -0,0 +1,109 @@
+import os
+from typing import Optional
+
+from platformdirs import PlatformDirs
+
+
+DEFAULTCONFIG = """
+[toggl]
+apikey = ""
+"""
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+def get_dirs() -> PlatformDirs:
+    return PlatformDirs('togglpy', 'Interitio')
+
+
+def load_config(dirs: PlatformDirs) -> tuple[str, dict]:
+    """
+    Load the user configuration, writing the default configuration if it doesn't exist.
+    Returns the configuration path along with the parsed configuration.
+    """
+    import toml
+
+    configdir = dirs.user_config_dir
+    configpath = os.path.join(configdir, 'config.toml')
+    if not os.path.exists(configpath):
+        os.makedirs(configdir)
+        with open(configpath, 'w') as f:
+            f.write(DEFAULTCONFIG)
+
+    return configpath, toml.load(configpath)
+
+
+def configure_logging(config: dict, default_level: str = 'WARNING'):
+    """
+    Set up logging from the [log] section of the configuration:
+        level   name of the lowest level to log, e.g. "debug"
+        file    path to log to instead of stderr
+    Debugging output on the hot paths is gated on the level,
+    so it costs next to nothing unless it is turned on.
+    """
+    import logging
+
+    options = config.get('log', {})
+    logging.basicConfig(
+        level=options.get('level', default_level).upper(),
+        filename=options.get('file'),
+        format=LOG_FORMAT,
+        force=True,
+    )
+
+
+def snapshot_path(dirs: PlatformDirs) -> str:
+    return os.path.join(dirs.user_cache_dir, 'state.json')
+
+
+def rowcache_path(dirs: PlatformDirs) -> str:
+    return os.path.join(dirs.user_cache_dir, 'rows.json')
+
+
+def journal_path(dirs: PlatformDirs) -> str:
+    # Pending actions are user data, and mustn't go when the cache is cleared
+    return os.path.join(dirs.user_data_dir, 'journal.jsonl')
+
+
+def socket_path(dirs: PlatformDirs) -> str:
+    return os.path.join(dirs.user_runtime_dir, 'toggl-rofi.sock')
+
+
+def trace_paths(dirs: PlatformDirs, config: dict) -> tuple[Optional[str], Optional[str]]:
+    """
+    Where to write launch traces, as plain JSON and in the Chrome trace event format.
+    Either is None when turned off in the [trace] section of the configuration.
+    """
+    options = config.get('trace', {})
+    path = os.path.join(dirs.user_cache_dir, 'trace.json') if options.get('enabled', True) else None
+    chrome_path = os.path.join(dirs.user_cache_dir, 'trace.chrome.json') if options.get('chrome', False) else None
+    return path, chrome_path
+
+
+def profile_path(dirs: PlatformDirs) -> str:
+    return os.path.join(dirs.user_cache_dir, 'launch.prof')
+
+
+def client_from_config(dirs: PlatformDirs, config: dict):
+    """
+    Build the RofiTrackClient described by the [toggl], [history] and [http] sections.
+    """
+    from .bulk import DEFAULT_CONCURRENCY
+    from .client import RofiTrackClient
+    from .scheduler import DEFAULT_BURST, DEFAULT_RATE, DEFAULT_RETRIES
+    from .session import DEFAULT_DNS_TTL, DEFAULT_KEEPALIVE
+
+    http = config.get('http', {})
+    return RofiTrackClient(
+        apikey=config['toggl']['apikey'],
+        snapshot_path=snapshot_path(dirs),
+        history_days=config.get('history', {}).get('days', 30),
+        journal_path=journal_path(dirs),
+        api_base=config['toggl'].get('api_base'),
+        keepalive=http.get('keepalive', DEFAULT_KEEPALIVE),
+        dns_ttl=http.get('dns_cache_ttl', DEFAULT_DNS_TTL),
+        concurrency=http.get('concurrency', DEFAULT_CONCURRENCY),
+        rate=http.get('rate', DEFAULT_RATE),
+        burst=http.get('burst', DEFAULT_BURST),
+        retries=http.get('retries', DEFAULT_RETRIES),
+    )
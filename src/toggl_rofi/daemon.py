@@ -0,0 +1,177 @@
+"""
+Resident daemon keeping a logged in client warm between hotkey presses.
+
+The daemon logs in once, keeps its state fresh with a periodic sync, and
+serves menu sessions over a Unix socket to the thin client in `remote`.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from . import tracing
+from .client import RofiTrackClient
+from .config import (
+    client_from_config, configure_logging, get_dirs, load_config, rowcache_path, socket_path, trace_paths
+)
+from .menus import TrackMenu
+from .remote import daemon_running, read_message, send_message
+from .rowcache import RowCache
+from .scheduler import BACKGROUND, use_lane
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_INTERVAL = 300
+
+
+class RemotePipe:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def write(self, data: bytes):
+        send_message(self.writer, {'op': 'write'}, data)
+
+    def writelines(self, lines):
+        self.write(b''.join(lines))
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        send_message(self.writer, {'op': 'close'})
+
+
+class RemoteProcess:
+    """
+    Process-like proxy for a rofi process run by the thin client.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.stdin = RemotePipe(writer)
+        self.returncode = None
+
+    async def communicate(self):
+        send_message(self.writer, {'op': 'read'})
+        await self.writer.drain()
+        header, stdout = await read_message(self.reader)
+        self.returncode = header['code']
+        return stdout, None
+
+    def terminate(self):
+        send_message(self.writer, {'op': 'terminate'})
+
+
+class RemoteLauncher:
+    """
+    Launches rofi through a connected thin client.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, executable: str = 'rofi'):
+        self.reader = reader
+        self.writer = writer
+        self.executable = executable
+
+    async def launch(self, argv: list[str]) -> RemoteProcess:
+        send_message(self.writer, {'op': 'launch', 'argv': [self.executable, *argv[1:]]})
+        await self.writer.drain()
+        return RemoteProcess(self.reader, self.writer)
+
+
+class Daemon:
+    def __init__(self, client: RofiTrackClient, row_cache: RowCache,
+                 sync_interval: float = DEFAULT_SYNC_INTERVAL, executable: str = 'rofi',
+                 trace_paths: tuple[Optional[str], Optional[str]] = (None, None), mode: str = 'history'):
+        self.client = client
+        self.row_cache = row_cache
+        self.sync_interval = sync_interval
+        self.executable = executable
+        # Where each menu session's trace is written
+        self.trace_paths = trace_paths
+        # Track menu mode each session starts in
+        self.mode = mode
+
+    async def sync_loop(self, now: bool = False):
+        # Behind the requests of any menu session
+        use_lane(BACKGROUND)
+        while True:
+            if not now:
+                await asyncio.sleep(self.sync_interval)
+            now = False
+            try:
+                await self.client.refresh()
+            except Exception:
+                logger.exception("Periodic sync failed.")
+            # Picks up after a flush which gave up, e.g. an offline daemon
+            self.client.flush_in_background()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Each connection is handled in its own task, so the trace only covers this session
+        trace = tracing.start('session')
+        op = None
+        try:
+            header, _ = await read_message(reader)
+            op = header['op']
+            if op == 'menu':
+                menu = TrackMenu(
+                    self.client, row_cache=self.row_cache, launcher=RemoteLauncher(reader, writer, self.executable),
+                    mode=self.mode,
+                )
+                with tracing.span('menu'):
+                    await menu.run()
+                with tracing.span('rowcache.save'):
+                    self.row_cache.save()
+        except Exception:
+            logger.exception("Menu session failed.")
+        finally:
+            writer.close()
+            # A ping is another daemon checking whether we are up, not a session
+            if op != 'ping':
+                trace.save(*self.trace_paths)
+
+    async def serve(self, path: str):
+        sync_task = None
+        try:
+            if await daemon_running(path):
+                raise SystemExit(f"A daemon is already listening on {path}")
+
+            # Serve straight from the snapshot if there is one, and sync in the background
+            from_snapshot = self.client.store is not None
+            if not from_snapshot:
+                await self.client.refresh()
+            self.client.flush_in_background()
+
+            if os.path.exists(path):
+                # Left over from a daemon which didn't shut down cleanly
+                os.remove(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            server = await asyncio.start_unix_server(self.handle, path=path)
+            sync_task = asyncio.create_task(self.sync_loop(now=from_snapshot))
+            logger.info("Listening on %s", path)
+            async with server:
+                await server.serve_forever()
+        finally:
+            if sync_task is not None:
+                sync_task.cancel()
+            await self.client.close()
+
+
+async def serve():
+    dirs = get_dirs()
+    _, config = load_config(dirs)
+    # The daemon has nobody watching, so says a little more by default
+    configure_logging(config, default_level='INFO')
+    if not config['toggl']['apikey']:
+        raise SystemExit("No API key set!")
+
+    client = client_from_config(dirs, config)
+    client.load_snapshot()
+
+    interval = config.get('daemon', {}).get('sync_interval', DEFAULT_SYNC_INTERVAL)
+    daemon = Daemon(
+        client, RowCache.load(rowcache_path(dirs)),
+        sync_interval=interval, executable=config.get('rofi', {}).get('executable', 'rofi'),
+        trace_paths=trace_paths(dirs, config), mode=config.get('menu', {}).get('mode', 'history'),
+    )
+    await daemon.serve(socket_path(dirs))
@@ -22,31 +22,114 @@ replaced.
 Project and tags could also have a special option 'New Project' and 'New Tag'
 for creation...
 """
-from toggl_track.lib import utc_now
+from datetime import tzinfo
+from enum import Enum
+from typing import Callable, Optional
 
-from .client import RofiTrackClient, ParsedEntry
+from .bulk import BulkResult
+from .client import AmbiguousNameError, RofiTrackClient, ParsedEntry
+from .completion import CompletionIndex
 from .rofi import MenuItem, Menu
-from .lib import pango_escape
+from .store import EntryRecord, ProjectRecord, TagRecord
+from .lib import pango_escape, utc_now
+
+
+def render_project(project: ProjectRecord) -> str:
+    return f"@<span color=\"{project.colour}\">{pango_escape(project.name)}</span>"
+
+
+def render_tag(tag: TagRecord) -> str:
+    return f"#{pango_escape(tag.name)}"
+
+
+def with_workspace(render: Callable[..., str], find: Callable[[str], list]) -> Callable[..., str]:
+    """
+    Render records, telling apart those sharing their name with another by workspace.
+    """
+    def render_record(record) -> str:
+        text = render(record)
+        if len(find(record.name)) > 1:
+            text += f" <i>(workspace {record.workspace_id})</i>"
+        return text
+    return render_record
+
+
+class PickerMenu(Menu):
+    """
+    Pick names from a completion index.
+
+    Rofi is given the best matches for the filter text, most used first,
+    rather than every name to filter itself.
+    Entering text which doesn't match a row shows the best matches for that text instead.
+    """
+    def __init__(self, index: CompletionIndex, render: Callable[..., str], **kwargs):
+        kwargs.setdefault('markup_rows', True)
+        kwargs.setdefault('case_insensitive', True)
+        kwargs.setdefault('tokenize', True)
+        kwargs.setdefault('format', 'i s')
+        super().__init__(**kwargs)
+        self.index = index
+        self.render = render
+
+    async def pick(self) -> list:
+        """
+        Returns the picked records, or nothing if the picker was cancelled.
+        """
+        while True:
+            await self.launch()
+            matches = self.index.query(self.filter or '')
+            await self.stream_rows((self.render(record).encode(), record) for record in matches)
+            resp = await self.read()
+            if not resp.text:
+                return []
+
+            selections = resp.selections()
+            picked = [self.items[index] for index, _ in selections if index is not None]
+            if picked:
+                return picked
+            text = selections[0][1]
+            if not text or text == self.filter:
+                # Nothing more to narrow down to
+                return []
+            self.filter = text
 
 
 class EditMenu(Menu):
+    # Rows of the editor, in order
+    DESC, PROJECT, TAGS, CONFIRM = range(4)
+
     def __init__(self, client: RofiTrackClient, entry: ParsedEntry | None = None, **kwargs):
         kwargs.setdefault('markup_rows', True)
-        kwargs.setdefault('format', 'f')
+        # The filter holds the entry being edited, and the row says what to do with it
+        kwargs.setdefault('format', 'i f')
         super().__init__(**kwargs)
 
         self.client = client 
         self.entry: ParsedEntry = entry if entry is not None else ParsedEntry('', desc=None, project=None)
-        self.filter = entry.format_for_edit()
+        self.filter = self.entry.format_for_edit()
 
     async def do_edit_desc(self):
         ...
 
     async def do_edit_project(self):
-        ...
+        picker = PickerMenu(
+            self.client.store.project_completions, with_workspace(render_project, self.client.store.find_projects),
+            prompt="Project", filter=self.entry.project or '', launcher=self.launcher,
+        )
+        picked = await picker.pick()
+        if picked:
+            self.entry.project = picked[0].name
+            self.entry.project_id = picked[0].id
 
     async def do_edit_tags(self):
-        ...
+        picker = PickerMenu(
+            self.client.store.tag_completions, with_workspace(render_tag, self.client.store.find_tags),
+            prompt="Tags", multi_select=True, launcher=self.launcher,
+        )
+        picked = await picker.pick()
+        if picked:
+            self.entry.tags = [tag.name for tag in picked]
+            self.entry.tag_ids = {tag.name.casefold(): tag.id for tag in picked}
 
     async def do_edit_start(self):
         ...
@@ -59,20 +142,18 @@ class EditMenu(Menu):
         # Error if fields don't exist 
         # Edit or start or add entry depending
         parsed = self.entry
-        projectid = None
-        if parsed.project:
-            project = self.client.get_project_by_name(parsed.project)
-            if project:
-                projectid = project.id
+        try:
+            projectid, tag_ids = self.client.resolve_names(parsed)
+        except AmbiguousNameError as e:
+            error_menu = Menu(message=str(e), launcher=self.launcher)
+            await error_menu.display()
+            return
 
-        tag_ids = []
-        for tagstr in parsed.tags:
-            tag = self.client.get_tag_by_name(tagstr)
-            if tag:
-                tag_ids.append(tag.id)
-
-        await self.client.start_entry(
-            workspace_id=self.client.default_workspace.id,
+        store = self.client.store
+        # A picked project may be in another workspace than the default
+        project = store.projects.get(projectid) if projectid is not None else None
+        await self.client.start_time_entry(
+            workspace_id=project.workspace_id if project else store.workspace_id,
             description=parsed.desc,
             start=utc_now(),
             project_id=projectid,
@@ -86,13 +167,22 @@ class EditMenu(Menu):
         # Display menu 
         # Write items 
         # Handle selections
+        store = self.client.store
         if self.entry.project:
-            project = self.client.get_project_by_name(self.entry.project)
+            try:
+                if self.entry.project_id is not None:
+                    project = store.projects.get(self.entry.project_id)
+                else:
+                    project = self.client.get_project_by_name(self.entry.project)
+                unknown = "Unknown Project"
+            except AmbiguousNameError:
+                project = None
+                unknown = "Ambiguous Project"
             if project:
                 pname = project.name
                 pcolour = project.colour
             else:
-                pname = f"{self.entry.project} (Unknown Project)"
+                pname = f"{self.entry.project} ({unknown})"
                 pcolour = "#FA1111"
             pname = pango_escape(pname)
             pfield = f"@<span color=\"{pcolour}\">{pname}</span>"
@@ -102,7 +192,16 @@ class EditMenu(Menu):
         if self.entry.tags:
             tags = []
             for tagstr in self.entry.tags:
-                tag = self.client.get_tag_by_name(tagstr)
+                if (tagid := self.entry.tag_ids.get(tagstr.casefold())) is not None:
+                    tag = store.tags.get(tagid)
+                    if tag:
+                        tags.append('#'+tag.name)
+                    continue
+                try:
+                    tag = self.client.get_tag_by_name(tagstr)
+                except AmbiguousNameError:
+                    tags.append(f"#{pango_escape(tagstr)} (Ambiguous Tag)")
+                    continue
                 if tag:
                     tags.append('#'+tag.name)
             tfield = f"@<span color='grey'>{' '.join(tags)}</span>"
@@ -131,8 +230,22 @@ class EditMenu(Menu):
         resp = await self.read()
 
         if resp.text:
-            text = resp.text.decode().strip()
+            index, text = resp.selection()
             parsed = self.client.parse_entry(text)
+            if parsed is not None:
+                # Names typed over are looked up again, picked ones keep their records
+                parsed.keep_picks(self.entry)
+            if index in (self.PROJECT, self.TAGS):
+                if parsed is not None:
+                    self.entry = parsed
+                if index == self.PROJECT:
+                    await self.do_edit_project()
+                else:
+                    await self.do_edit_tags()
+                # Back to the editor with the picked names filled in
+                self.filter = self.entry.format_for_edit()
+                return await self.run()
+
             if parsed is None:
                 raise ValueError("Couldn't parse provided input")
             self.entry = parsed 
@@ -141,10 +254,6 @@ class EditMenu(Menu):
             # if text == items[0].text:
             #     # Description 
             #     await self.do_edit_desc()
-            # elif text == items[1].text:
-            #     await self.do_edit_project()
-            # elif text == items[2].text:
-            #     await self.do_edit_tags()
             # else:
             #     if text == items[3].text:
             #         parsed = self.entry
@@ -155,3 +264,103 @@ class EditMenu(Menu):
             #             raise ValueError("Couldn't parse provided input.")
             #         self.entry = parsed
             #     await self.do_confirm()
+
+
+class BulkMenu(Menu):
+    """
+    Act on several entries at once, then show how it went for each of them.
+    """
+    Actions = Enum('BulkActions', ('STOP', 'DELETE', 'PROJECT', 'TAGS', 'DUPLICATE'))
+    labels = {
+        Actions.STOP: "Stop",
+        Actions.DELETE: "Delete",
+        Actions.PROJECT: "Set project...",
+        Actions.TAGS: "Set tags...",
+        Actions.DUPLICATE: "Duplicate to today",
+    }
+
+    def __init__(self, client: RofiTrackClient, entries: list[EntryRecord], timezone: tzinfo, **kwargs):
+        kwargs.setdefault('markup_rows', True)
+        kwargs.setdefault('no_custom', True)
+        kwargs.setdefault('format', 'i s')
+        kwargs.setdefault('prompt', f"{len(entries)} entries")
+        super().__init__(**kwargs)
+
+        self.client = client
+        self.entries = entries
+        self.timezone = timezone
+
+    async def confirm(self, question: str) -> bool:
+        menu = Menu(prompt=question, no_custom=True, format='i s', launcher=self.launcher)
+        await menu.display()
+        # No comes first, so a stray Return doesn't confirm
+        await menu.write_items(MenuItem("No"), MenuItem("Yes"))
+        resp = await menu.read()
+        return bool(resp.text) and resp.selection()[0] == 1
+
+    async def act(self, action) -> Optional[BulkResult]:
+        """
+        Carry out the action on the entries, returning None if it was called off.
+        """
+        client = self.client
+        if action is self.Actions.STOP:
+            return await client.bulk_stop(self.entries)
+        elif action is self.Actions.DELETE:
+            if await self.confirm(f"Delete {len(self.entries)} entries?"):
+                return await client.bulk_delete(self.entries)
+        elif action is self.Actions.PROJECT:
+            picker = PickerMenu(
+                client.store.project_completions, with_workspace(render_project, client.store.find_projects),
+                prompt="Project", launcher=self.launcher,
+            )
+            if picked := await picker.pick():
+                return await client.bulk_update(self.entries, {'project_id': picked[0].id})
+        elif action is self.Actions.TAGS:
+            picker = PickerMenu(
+                client.store.tag_completions, with_workspace(render_tag, client.store.find_tags),
+                prompt="Tags", multi_select=True, launcher=self.launcher,
+            )
+            if picked := await picker.pick():
+                return await client.bulk_update(self.entries, {'tag_ids': [tag.id for tag in picked]})
+        elif action is self.Actions.DUPLICATE:
+            today = utc_now().astimezone(self.timezone).date()
+            return await client.bulk_duplicate(self.entries, today, self.timezone)
+        return None
+
+    def render_entry(self, entry: EntryRecord) -> str:
+        start = entry.start.astimezone(self.timezone).strftime('%Y-%m-%d %H:%M')
+        return f"{start}  {pango_escape(entry.description or 'No description')}"
+
+    def make_result_items(self, result: BulkResult) -> list[MenuItem]:
+        # Failures first, they are what needs looking at
+        items = [
+            MenuItem(f"<span color='#ff0000'>Failed</span>  {self.render_entry(entry)}  <i>{pango_escape(message)}</i>")
+            for entry, message in result.failed
+        ]
+        items.extend(
+            MenuItem(f"<span color='#00aa00'>Done</span>    {self.render_entry(entry)}")
+            for entry in result.succeeded
+        )
+        return items
+
+    async def run(self) -> Optional[BulkResult]:
+        actions = list(self.Actions)
+        await self.display()
+        await self.write_items(*(MenuItem(self.labels[action]) for action in actions))
+        resp = await self.read()
+        if not resp.text:
+            return None
+        index, _ = resp.selection()
+        if index is None:
+            return None
+
+        result = await self.act(actions[index])
+        if result is None:
+            return None
+        report = Menu(
+            message=result.summary(), markup_rows=True, no_custom=True, prompt="Result", launcher=self.launcher,
+        )
+        await report.display()
+        await report.write_items(*self.make_result_items(result))
+        await report.read()
+        return result
@@ -0,0 +1,132 @@
+"""
+Write-ahead journal of time entry actions waiting to reach the API.
+
+Starting or stopping a timer is recorded here and applied to the local store
+before anything is sent, so the menu can close straight away and the action
+survives a slow or missing network, or the process exiting.
+The client then replays the journal to the API in order.
+
+The journal is a file of JSON lines, only ever appended to while actions are pending:
+    {"action": {...}}               an action was recorded
+    {"sending": id}                 an attempt to send the action is about to be made
+    {"done": id, "entry_id": id}    the API accepted the action
+    {"conflict": id, "message": s}  the API refused the action, it won't be retried
+Once nothing is pending the file is rewritten with just the unreported conflicts.
+A torn last line, from a crash mid-write, is ignored on load.
+"""
+import json
+import os
+import uuid
+from typing import Optional
+
+from .lib import utc_now
+
+
+class Journal:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        # action id -> action, in the order they were recorded
+        self.pending: dict[str, dict] = {}
+        # Actions the API refused, with the reason, until they are shown to the user
+        self.conflicts: list[dict] = []
+
+    def __bool__(self):
+        return bool(self.pending)
+
+    def _append(self, line: dict):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(line) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, op: str, **fields) -> dict:
+        """
+        Durably record a new action, returning it.
+        """
+        action = {'id': uuid.uuid4().hex, 'op': op, 'created': utc_now().isoformat(), **fields}
+        self._append({'action': action})
+        self.pending[action['id']] = action
+        return action
+
+    def sending(self, action: dict):
+        """
+        Note that the action is about to be sent.
+        An action which was sent before may already have been applied by the API.
+        """
+        self._append({'sending': action['id']})
+        action['sent'] = True
+
+    def done(self, action: dict, entry_id: Optional[int] = None):
+        """
+        Mark the action as applied by the API.
+        `entry_id` is the server id of the entry the action created,
+        which later actions on the same entry are updated to refer to.
+        """
+        self._append({'done': action['id'], 'entry_id': entry_id})
+        self._complete(action['id'], entry_id)
+        self._compact()
+
+    def conflict(self, action: dict, message: str):
+        """
+        Mark the action as refused by the API, keeping it to report to the user.
+        """
+        self._append({'conflict': action['id'], 'message': message})
+        self.pending.pop(action['id'], None)
+        self.conflicts.append({'action': action, 'message': message})
+        self._compact()
+
+    def clear_conflicts(self):
+        if self.conflicts:
+            self.conflicts.clear()
+            self._compact()
+
+    def _complete(self, actionid: str, entry_id: Optional[int]):
+        action = self.pending.pop(actionid, None)
+        if action is not None and entry_id is not None and action.get('entry_id') != entry_id:
+            # Point later actions at the server copy of the entry
+            for later in self.pending.values():
+                if later.get('entry_id') == action.get('entry_id'):
+                    later['entry_id'] = entry_id
+
+    def _compact(self):
+        if self.path is None or self.pending:
+            return
+        tmppath = self.path + '.tmp'
+        with open(tmppath, 'w') as f:
+            for conflict in self.conflicts:
+                f.write(json.dumps({'action': conflict['action']}) + '\n')
+                f.write(json.dumps({'conflict': conflict['action']['id'], 'message': conflict['message']}) + '\n')
+        os.replace(tmppath, self.path)
+
+    @classmethod
+    def load(cls, path: str) -> 'Journal':
+        journal = cls(path)
+        try:
+            with open(path) as f:
+                lines = f.readlines()
+        except OSError:
+            return journal
+
+        actions = {}
+        for line in lines:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            if 'action' in data:
+                action = data['action']
+                actions[action['id']] = action
+                journal.pending[action['id']] = action
+            elif 'sending' in data:
+                if (action := journal.pending.get(data['sending'])) is not None:
+                    action['sent'] = True
+            elif 'done' in data:
+                journal._complete(data['done'], data.get('entry_id'))
+            elif 'conflict' in data:
+                journal.pending.pop(data['conflict'], None)
+                if (action := actions.get(data['conflict'])) is not None:
+                    journal.conflicts.append({'action': action, 'message': data['message']})
+        return journal
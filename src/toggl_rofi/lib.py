@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 from typing import Any, TypeVar
 
 T = TypeVar('T')
@@ -22,3 +23,6 @@ def pango_escape(str):
 
 def format_duration(seconds):
     return f"{int(seconds // 3600):02d}:{int(seconds // 60 % 60):02d}"
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
@@ -1,60 +1,151 @@
+"""
+Entry point for toggl-rofi.
+
+Launch latency matters here, so the heavier modules are only imported
+by the paths that use them. Handing over to a running daemon needs
+nothing beyond the standard library and the configuration paths.
+"""
+import argparse
 import asyncio
 import logging
-import toml
 import os
-from platformdirs import PlatformDirs
 
-from .client import RofiTrackClient
-from .menus import TrackMenu
-from .rofi import Menu
+from . import tracing
+from .config import (
+    client_from_config, configure_logging, get_dirs, load_config, profile_path, rowcache_path, socket_path,
+    trace_paths
+)
+from .remote import run_remote
 
 
-logging.getLogger(__name__).setLevel(logging.DEBUG)
+logger = logging.getLogger(__name__)
 
-DEFAULTCONFIG = """
-[toggl]
-apikey = ""
-"""
+# Grace period for sending actions after the menu closes, it isn't waited out
+# once an attempt fails. Anything left stays in the journal for the next launch
+FLUSH_TIMEOUT = 2
 
 
 async def main():
-    dirs = PlatformDirs('togglpy', 'Interitio')
-    configdir = dirs.user_config_dir
-    configpath = os.path.join(configdir, 'config.toml')
-    if not os.path.exists(configpath):
-        os.makedirs(configdir)
-        with open(configpath, 'w') as f:
-            f.write(DEFAULTCONFIG)
-        
-    config = toml.load(configpath)
+    with tracing.span('import'):
+        from .rofi import ProcessLauncher
+
+    with tracing.span('config'):
+        dirs = get_dirs()
+        configpath, config = load_config(dirs)
+        configure_logging(config)
+    rofi = config.get('rofi', {})
+    if rofi.get('backend', 'dmenu') == 'script':
+        # One rofi for every menu of the launch
+        from .scriptmode import ScriptLauncher
+        launcher = ScriptLauncher(rofi.get('executable', 'rofi'))
+    else:
+        launcher = ProcessLauncher(rofi.get('executable', 'rofi'))
+
+    try:
+        await run_menu(dirs, config, configpath, launcher)
+    finally:
+        # Error menus are shown by the script backend until dismissed
+        await launcher.close()
+        if (trace := tracing.current()) is not None:
+            trace.save(*trace_paths(dirs, config))
+
+
+async def run_menu(dirs, config: dict, configpath: str, launcher):
+    from .rofi import Menu
 
     if not config['toggl']['apikey']:
-        error_menu = Menu(message=f"No API key set!\nPlease add your toggl API key to the configuration file:\n{configpath}")
+        error_menu = Menu(
+            message=f"No API key set!\nPlease add your toggl API key to the configuration file:\n{configpath}",
+            launcher=launcher,
+        )
         await error_menu.display()
         return
-    try:
-        client = RofiTrackClient()
-        await client.login(APIKey=config['toggl']['apikey'])
-        await client.sync()
-    except Exception as e:
-        error_menu = Menu(message=f"Could not login!\n{e}")
-        await error_menu.display()
-        raise
 
-    logging.info(f"Logged in as {client.profile.id} in {client.profile.timezone}")
-    logging.info(f"{len(client.state.projects)} Projects, {len(client.state.time_entries)} Time Entries")
-    # print(f"Longest project: {max((len(p.name) for p in client.state.projects.values()), default=0)}")
-    # print(f"Longest entry: {max((len(e.description) for e in client.state.time_entries.values()), default=0)}")
+    with tracing.span('import'):
+        from .menus import TrackMenu
+        from .rowcache import RowCache
+        client = client_from_config(dirs, config)
+    # Closed on the way out, however the menu ends
+    async with client:
+        try:
+            with tracing.span('login'):
+                if client.load_snapshot():
+                    # Render from the snapshot, and sync while the menu is open
+                    client.refresh_in_background()
+                else:
+                    await client.refresh()
+            # Send anything left over from previous launches
+            client.flush_in_background()
+        except Exception as e:
+            error_menu = Menu(message=f"Could not login!\n{e}", launcher=launcher)
+            await error_menu.display()
+            raise
+
+        logger.info("Logged in as %s in %s", client.store.profile_id, client.store.timezone)
+        logger.info("%d Projects, %d Time Entries", len(client.store.projects), len(client.store.time_entries))
+
+        with tracing.span('rowcache.load'):
+            row_cache = RowCache.load(rowcache_path(dirs))
+        menu = TrackMenu(
+            client, row_cache=row_cache, launcher=launcher, mode=config.get('menu', {}).get('mode', 'history')
+        )
+        with tracing.span('menu'):
+            await menu.run()
+        with tracing.span('rowcache.save'):
+            row_cache.save()
 
-    menu = TrackMenu(client)
-    await menu.run()
+        with tracing.span('flush.wait'):
+            flushed = await client.wait_flushed(timeout=FLUSH_TIMEOUT)
+        if not flushed:
+            logger.warning("%d actions still waiting to be sent.", len(client.journal.pending))
 
+        # Let the background sync finish so the snapshot is up to date next launch
+        try:
+            with tracing.span('sync.wait'):
+                await client.wait_synced()
+        except Exception as e:
+            # The menu was already shown from the snapshot, the next launch syncs again
+            logger.warning("Background sync failed: %r", e)
 
-    await client.http.session.close()
+
+async def launch():
+    # Started before handing over, so the daemon-less path is traced from the top.
+    # A remote session is traced by the daemon instead.
+    tracing.start('launch')
+    # Hand over to the daemon if one is running
+    if not await run_remote(socket_path(get_dirs())):
+        await main()
 
 
 def run():
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(prog='toggl-rofi', description="Rofi UI for the Toggl Track API")
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help="Run a resident daemon keeping the client logged in and synced between launches."
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="Run under cProfile, writing the stats to launch.prof in the cache directory."
+    )
+    args = parser.parse_args()
+
+    if args.daemon:
+        from .daemon import serve
+        entry = serve
+    else:
+        entry = launch
+
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(asyncio.run, entry())
+        finally:
+            path = profile_path(get_dirs())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            profiler.dump_stats(path)
+    else:
+        asyncio.run(entry())
 
 
 if __name__ == '__main__':
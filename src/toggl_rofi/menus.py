@@ -1,39 +1,34 @@
-from collections import defaultdict, namedtuple
-from dataclasses import dataclass
+from bisect import bisect_left
 from enum import Enum
-import re
-from typing import NamedTuple
-import datetime as dt
-from datetime import datetime
+import itertools
+import logging
+from datetime import timedelta
 from operator import itemgetter
-
-import pytz
-from toggl_track import Optional, TimeEntry
-from toggl_track.lib import utc_now
-
-from .client import ParsedEntry, RofiTrackClient
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from . import tracing
+from .client import AmbiguousNameError, ParsedEntry, RofiTrackClient
+from .rowcache import Row, RowCache
+from .store import EntryRecord
+from .tasks import Task
 from .rofi import MenuItem, Menu
-from .lib import format_duration, pango_escape
-from .editor import EditMenu
+from .lib import format_duration, pango_escape, utc_now
 
+logger = logging.getLogger(__name__)
 
-class EntryItem(MenuItem):
-    def __init__(self, text, entry: TimeEntry, **kwargs):
-        super().__init__(text, **kwargs)
-        self.entry = entry
 
-    def format_for_edit(self):
-        entry = self.entry
-        parts = []
-        parts.append(entry.description)
-        if project := entry.project:
-            parts.append(f"@{project.name}")
+def format_for_edit(entry: EntryRecord) -> str:
+    parts = []
+    parts.append(entry.description)
+    if project := entry.project:
+        parts.append(f"@{project.name}")
 
-        if entry.tags:
-            tagstr = ' '.join(f"#{tag}" for tag in entry.tags)
-            parts.append(tagstr)
+    if entry.tags:
+        tagstr = ' '.join(f"#{tag}" for tag in entry.tags)
+        parts.append(tagstr)
 
-        return '    '.join(parts)
+    return '    '.join(parts)
 
 
 class CustomMenu(Menu):
@@ -49,7 +44,7 @@ class CustomMenu(Menu):
     def make_items(self):
         # Testing for project acmpl
         items = []
-        for project in self.client.state.projects.values():
+        for project in self.client.store.project_completions.query(''):
             pname = project.name
             pcolour = project.colour
             esc_pname = pango_escape(pname)
@@ -64,78 +59,119 @@ class CustomMenu(Menu):
 
 
 class TrackMenu(Menu):
-    Keys = Enum('TrackMenuKeys', ('EDIT', 'HELP', 'REFRESH'))
+    Keys = Enum('TrackMenuKeys', ('EDIT', 'HELP', 'REFRESH', 'MODE'))
     keys = list(Keys)
     default_keymap = {
         Keys.EDIT: 'Alt+Return',
         Keys.HELP: 'Alt+h',
         Keys.REFRESH: 'Alt+r',
+        Keys.MODE: 'Alt+t',
     }
+    # Every entry in the history, or one row for each distinct task
+    modes = ('history', 'recent')
 
-    def __init__(self, client: RofiTrackClient, keymap={}, **kwargs):
+    def __init__(self, client: RofiTrackClient, keymap={}, row_cache: Optional[RowCache] = None,
+                 mode: str = 'history', **kwargs):
         kwargs.setdefault('markup_rows', True)
         kwargs.setdefault('case_insensitive', True)
         kwargs.setdefault('matching', 'fuzzy')
         kwargs.setdefault('tokenize', True)
+        # Report the selected row index, so we never have to match rendered text
+        kwargs.setdefault('format', 'i s')
+        # Several rows can be picked to act on them all at once
+        kwargs.setdefault('multi_select', True)
+        # Show the window after the first screenful, and keep reading rows after
+        kwargs.setdefault('async_pre_read', 25)
         super().__init__(**kwargs)
         self.keymap = self.default_keymap | keymap
 
         self.client = client
-        self.entries: list[TimeEntry] = []
+        self.entries: list[EntryRecord] = []
+        self.row_cache = row_cache if row_cache is not None else RowCache()
+        # Only entries started after this are shown, until older entries are requested
+        self.history_start = utc_now() - client.history_window
+        self.older_item = MenuItem("<i>Load older entries...</i>")
+        # Why the last attempt to load older entries failed, shown in the next header
+        self.history_error: Optional[str] = None
+        if mode not in self.modes:
+            raise ValueError(f"Unknown track menu mode '{mode}'")
+        self.mode = mode
         # TODO: Add this to configuration
-        self.timezone = pytz.timezone(client.profile.timezone or 'utc')
+        self.timezone = ZoneInfo(client.store.timezone or 'UTC')
 
-    def make_items(self, entries):
+    def render_row(self, entry: EntryRecord, desc_width: int, proj_width: int) -> Row:
+        """
+        Render the position independent parts of an entry's row.
+        """
         tz = self.timezone
+        desc = pango_escape(entry.description or "No description")
+        start = entry.start.astimezone(tz)
+        date_str = str(start.date())
+        start_str = start.strftime('%H:%M')
+        stop_str = entry.stop.astimezone(tz).strftime('%H:%M') if entry.stop else 'NOW  '
+        dur = format_duration(entry.actual_duration)
 
-        desc_width = max(
-            (len(e.description or 'No Description') for e in entries),
-            default=0
-        )
-        proj_width = max(
-            (len(e.project.name if e.project else 'No Project') for e in entries),
-            default=0
-        ) + 5
+        parts = []
+        parts.append(f"{desc:<{desc_width}}")
+        if project := entry.project:
+            pname = project.name
+            pcolour = project.colour
+            esc_pname = pango_escape(pname)
+            pfield = proj_width + len(esc_pname) - len(pname)
+            parts.append(
+                f" @<span color=\"{pcolour}\">{esc_pname:<{pfield}}</span>"
+            )
+        return date_str, ''.join(parts), f"{start_str} - {stop_str} ({dur})"
+
+    def make_rows(self, entries):
+        """
+        Lazily render the encoded rows for the given entries, newest first,
+        paired with their entries.
+        Rows for unchanged entries are taken from the row cache.
+
+        Rows are numbered from the newest entry,
+        so the numbers stay the same as older entries are loaded.
+        """
+        cache = self.row_cache
+        desc_width, proj_width = cache.prepare(str(self.timezone), entries)
+        proj_width += 5
 
         dates = set()
-        items = {}
         for i, entry in enumerate(reversed(entries)):
-            i = len(entries) - i - 1
-            desc = pango_escape(entry.description or "No description")
+            row = cache.get(entry)
+            if row is None:
+                row = self.render_row(entry, desc_width, proj_width)
+                cache.put(entry, row)
+            date_str, body, times = row
 
-            date_str = entry.start.astimezone(tz).date()
             if date_str not in dates:
                 dates.add(date_str)
             else:
                 date_str = ""
 
-            start_str = entry.start.astimezone(tz).strftime('%H:%M')
-            stop_str = entry.stop.astimezone(tz).strftime('%H:%M') if entry.stop else 'NOW  '
-            dur = format_duration(entry.actual_duration)
+            text = f"<span color=\"gray\">{i:>2}. </span>{body}{date_str:<10}  {times}"
+            yield text.encode(), entry
 
-            parts = []
-            parts.append(f"<span color=\"gray\">{i:>2}. </span>")
-            parts.append(f"{desc:<{desc_width}}")
-            if project := entry.project:
-                pname = project.name
-                pcolour = project.colour
-                esc_pname = pango_escape(pname)
-                pfield = proj_width + len(esc_pname) - len(pname)
-                parts.append(
-                    f" @<span color=\"{pcolour}\">{esc_pname:<{pfield}}</span>"
-                )
-            parts.append(
-                f"{pango_escape(str(date_str)):<10}  {start_str} - {stop_str} ({dur})"
-            )
-
-            text = ''.join(parts)
-            item = EntryItem(text, entry)
-            items[entry.id] = item
-        return items
+    def make_task_rows(self, tasks: list[Task]):
+        """
+        Lazily render the encoded rows for the given tasks, paired with their tasks.
+        Each row shows the task's latest entry, when it was last used,
+        how many entries it has and the total time tracked on it.
+        """
+        desc_width = max((len(task.entry.description or 'No description') for task in tasks), default=0)
+        proj_width = max(
+            (len(task.entry.project.name) for task in tasks if task.entry.project is not None), default=0
+        ) + 5
+        for task in tasks:
+            date_str, body, _ = self.render_row(task.entry, desc_width, proj_width)
+            last = 'NOW' if task.running else date_str
+            text = f"{body}{last:<10}  {task.count:>4}x  ({format_duration(task.total())})"
+            yield text.encode(), task
 
     def make_mini_items(self):
         items = []
-        for project in self.client.state.projects.values():
+        # Most used first, rather than every project
+        for project in self.client.store.project_completions.query(''):
             pname = project.name
             pcolour = project.colour
             esc_pname = pango_escape(pname)
@@ -146,26 +182,14 @@ class TrackMenu(Menu):
         return items
 
     def make_header(self):
-        tz = self.timezone
-        start_of_day = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
-
-        proj_times = defaultdict(int)
-        proj_index = {}
-        for entry in reversed(self.entries):
-            print(entry)
-            if entry.stop and entry.stop < start_of_day:
-                break 
-            elif entry.start < start_of_day:
-                contributes = entry.actual_duration - (start_of_day - entry.start).total_seconds()
-            else:
-                contributes = entry.actual_duration
-            proj_times[entry.project_id] += int(contributes)
-            if entry.project_id is not None:
-                proj_index[entry.project_id] = entry.project
+        store = self.client.store
+        totals = store.totals
+        now = utc_now()
+        today = now.astimezone(self.timezone).date()
 
         lines = []
-        for pid, dur in sorted(list(proj_times.items()), key=itemgetter(1), reverse=True):
-            project = proj_index.get(pid)
+        for pid, dur in sorted(totals.day(today, now).items(), key=itemgetter(1), reverse=True):
+            project = store.projects.get(pid) if pid is not None else None
             if project is None:
                 pname = "No Project"
                 pcolour = "#000000"
@@ -174,61 +198,132 @@ class TrackMenu(Menu):
                 pcolour = project.colour
             esc_pname = pango_escape(pname)
             pname_col = f"<span color=\'{pcolour}\'>{esc_pname}</span>"
-            print(pname_col)
             dur_str = format_duration(dur)
             lines.append(f"<b>{dur_str}</b> -- {pname_col}")
         if lines:
             header = '\n'.join(lines)
         else:
             header = "<i>No time tracked today</i>"
+
+        week = totals.total(today - timedelta(days=today.weekday()), today, now)
+        month = totals.total(today.replace(day=1), today, now)
+        header += (
+            f"\n<i>This week {format_duration(week)} -- This month {format_duration(month)}</i>"
+        )
+
+        journal = self.client.journal
+        if journal.pending:
+            header += f"\n<i>{len(journal.pending)} changes waiting to sync</i>"
+        for conflict in journal.conflicts:
+            action = conflict['action']
+            desc = pango_escape(action.get('description') or 'No Description')
+            message = pango_escape(conflict['message'])
+            header += f"\n<span color='#ff0000'>Could not {action['op']} '{desc}': {message}</span>"
+        if self.history_error is not None:
+            header += f"\n<span color='#ff0000'>Could not load older entries: {pango_escape(self.history_error)}</span>"
         return header
 
     async def run(self):
-        entries = self.entries = sorted(self.client.state.time_entries.values(), key=lambda e: e.start)
-        self.message = self.make_header()
-
-        await self.display()
-        items = self.make_items(entries)
-        await self.write_items(*items.values())
+        entries = self.entries = sorted(self.client.store.time_entries.values(), key=lambda e: e.start)
+        with tracing.span('header'):
+            self.message = self.make_header()
+        self.history_error = None
+        # Reported now, so they don't need to be kept
+        self.client.journal.clear_conflicts()
+
+        # Get the rofi window coming up while we prepare the rows
+        await self.launch()
+        if self.mode == 'recent':
+            tasks = self.client.store.tasks.ranked()
+            with tracing.span('rows', count=len(tasks), mode=self.mode):
+                await self.stream_rows(self.make_task_rows(tasks))
+        else:
+            shown = entries[bisect_left(entries, self.history_start, key=lambda e: e.start):]
+            with tracing.span('rows', count=len(shown), mode=self.mode):
+                older = (self.older_item.formatted(), self.older_item)
+                await self.stream_rows(itertools.chain(self.make_rows(shown), (older,)))
 
         resp = await self.read()
-        print(resp)
-        print(resp.code)
+        logger.debug("Track menu response %r", resp)
 
         if resp.code >= 10:
             key = self.keys[resp.code - 10]
         else:
             key = None
 
+        rows = []
+        selected = None
+        # Typed text, when no row was picked
+        text = None
         if resp.text:
-            text = resp.text.decode().strip()
-            # Find item matching this text, if it exists
-            selected_item = next(
-                (item for item in items.values() if item.text == text),
-                None
-            )
-            if selected_item:
-                parsed = None
+            selections = resp.selections()
+            rows = [self.items[index] for index, _ in selections if index is not None]
+            if rows:
+                selected = rows[0]
             else:
-                parsed = self.client.parse_entry(text)
-                if parsed is None:
-                    # TODO: Error menu/message
-                    raise ValueError("Couldn't parse provided input.")
-        else:
-            selected_item = None
-            parsed = None
+                text = selections[0][1]
+
+        if len(rows) > 1:
+            # Act on every picked entry at once, and every entry of picked tasks
+            entries = []
+            for row in rows:
+                if isinstance(row, Task):
+                    entries.extend(sorted(row.entries.values(), key=lambda e: e.start))
+                elif isinstance(row, EntryRecord):
+                    entries.append(row)
+            from .editor import BulkMenu
+            menu = BulkMenu(self.client, entries, self.timezone, launcher=self.launcher)
+            result = await menu.run()
+            logger.debug("Bulk action result %r", result)
+            return
+
+        if selected is self.older_item:
+            # Extend the window by another page and show the menu again
+            start = self.history_start - self.client.history_window
+            try:
+                await self.client.load_history(start)
+            except Exception as e:
+                # e.g. offline, show the same window again with the reason
+                logger.warning("Could not load older entries: %r", e)
+                self.history_error = str(e) or type(e).__name__
+            else:
+                self.history_start = start
+            return await self.run()
+
+        if key is self.Keys.MODE:
+            # Switch between the history and recent tasks, keeping what was typed
+            self.mode = self.modes[(self.modes.index(self.mode) + 1) % len(self.modes)]
+            self.filter = text
+            return await self.run()
+
+        parsed = None
+        if text is not None:
+            parsed = self.client.parse_entry(text)
+            if parsed is None:
+                # TODO: Error menu/message
+                raise ValueError("Couldn't parse provided input.")
+
+        if isinstance(selected, Task):
+            # Act on the task's latest entry
+            selected = selected.entry
 
         if key is self.Keys.EDIT:
             # Run edit menu
             # TODO: make separate menu
-            if selected_item:
-                entry = self.client.parse_entry(selected_item.format_for_edit())
+            if selected is not None:
+                entry = self.client.parse_entry(format_for_edit(selected))
+                if entry is not None:
+                    # Its own project and tags, rather than whatever shares their names
+                    entry.project_id = selected.project_id
+                    tags = self.client.store.tags
+                    entry.tag_ids = {tags[tagid].name.casefold(): tagid for tagid in selected.tag_ids if tagid in tags}
             else:
                 entry = None
-            menu = EditMenu(self.client, entry=entry)
+            from .editor import EditMenu
+            menu = EditMenu(self.client, entry=entry, launcher=self.launcher)
             await menu.run()
-            # if selected_item:
-            #     self.filter = selected_item.format_for_edit()
+            # if selected is not None:
+            #     self.filter = format_for_edit(selected)
             #     await self.run()
         elif key is self.Keys.HELP:
             # Show help message
@@ -240,29 +335,24 @@ class TrackMenu(Menu):
             ...
         else:
             # Start/Stop/Continue based on text given
-            if selected_item is not None:
-                selected_entry = selected_item.entry
-                if selected_entry.running:
-                    print("Stopping!")
-                    await selected_entry.stop_entry()
+            if selected is not None:
+                if selected.running:
+                    logger.debug("Stopping entry %s", selected.id)
+                    await self.client.stop_time_entry(selected)
                 else:
-                    await selected_entry.continue_entry()
+                    logger.debug("Continuing entry %s", selected.id)
+                    await self.client.continue_time_entry(selected)
             elif parsed is not None:
                 # TODO: Show errors if we can't find project or tag
-                projectid = None
-                if parsed.project:
-                    project = self.client.get_project_by_name(parsed.project)
-                    if project:
-                        projectid = project.id
-
-                tag_ids = []
-                for tagstr in parsed.tags:
-                    tag = self.client.get_tag_by_name(tagstr)
-                    if tag:
-                        tag_ids.append(tag.id)
-
-                await self.client.start_entry(
-                    workspace_id=self.client.default_workspace.id,
+                try:
+                    projectid, tag_ids = self.client.resolve_names(parsed)
+                except AmbiguousNameError as e:
+                    error_menu = Menu(message=str(e), launcher=self.launcher)
+                    await error_menu.display()
+                    return
+
+                await self.client.start_time_entry(
+                    workspace_id=self.client.store.workspace_id,
                     description=parsed.desc,
                     start=utc_now(),
                     project_id=projectid,
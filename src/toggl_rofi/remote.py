@@ -0,0 +1,89 @@
+"""
+Thin client for the toggl-rofi daemon.
+
+The daemon owns the logged in client and builds the menus, but rofi has to
+be run from the environment of the hotkey that launched us.
+So the daemon drives rofi remotely over the Unix socket, and this side only
+spawns rofi, pipes rows into it, and sends the response back.
+
+Each message is a single line of JSON, optionally followed by `size` bytes of payload.
+"""
+import asyncio
+import json
+
+
+def send_message(writer: asyncio.StreamWriter, header: dict, payload: bytes = b''):
+    if payload:
+        header['size'] = len(payload)
+    writer.write(json.dumps(header).encode() + b'\n' + payload)
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[dict, bytes]:
+    header = json.loads(await reader.readuntil(b'\n'))
+    payload = await reader.readexactly(header['size']) if header.get('size') else b''
+    return header, payload
+
+
+async def daemon_running(path: str) -> bool:
+    """
+    Whether a daemon answers on the given socket, rather than it being left over.
+    """
+    try:
+        _, writer = await asyncio.open_unix_connection(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+    send_message(writer, {'op': 'ping'})
+    writer.close()
+    return True
+
+
+async def run_remote(path: str) -> bool:
+    """
+    Run a menu session through the daemon listening on the given socket.
+    Returns False if there is no daemon to connect to.
+    """
+    try:
+        reader, writer = await asyncio.open_unix_connection(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+
+    send_message(writer, {'op': 'menu'})
+    await writer.drain()
+
+    process = None
+    try:
+        while True:
+            try:
+                header, payload = await read_message(reader)
+            except asyncio.IncompleteReadError:
+                # Daemon closed the session
+                break
+
+            op = header['op']
+            if op == 'launch':
+                process = await asyncio.create_subprocess_exec(
+                    *header['argv'],
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                )
+            elif op == 'write':
+                try:
+                    process.stdin.write(payload)
+                    await process.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    # Rofi already exited, the response will follow
+                    pass
+            elif op == 'close':
+                process.stdin.close()
+            elif op == 'read':
+                stdout, _ = await process.communicate()
+                send_message(writer, {'op': 'response', 'code': process.returncode}, stdout)
+                await writer.drain()
+                process = None
+            elif op == 'terminate':
+                process.terminate()
+                process = None
+    finally:
+        # A menu left open, e.g. an error message, stays up after we exit
+        writer.close()
+    return True
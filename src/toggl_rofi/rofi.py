@@ -1,6 +1,11 @@
 import itertools
 import asyncio
-from typing import Optional
+import logging
+from typing import Any, Iterable, Optional
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
 
 
 class RofiResponse:
@@ -12,8 +17,32 @@ class RofiResponse:
     def __repr__(self):
         return f"<RofiResponse {self.text=} {self.code=} {self.info=}>"
 
+    def selection(self) -> tuple[Optional[int], str]:
+        """
+        Split a response from a menu run with `-format 'i s'`
+        into the selected row index and the selected text.
+        The index is None when the user entered custom text.
+        """
+        index, _, text = self.text.decode().rstrip('\n').partition(' ')
+        index = int(index)
+        return (index if index >= 0 else None), text.strip()
+
+    def selections(self) -> list[tuple[Optional[int], str]]:
+        """
+        Split a response from a `-multi-select` menu run with `-format 'i s'`,
+        with one line per selected row, as for `selection`.
+        """
+        selections = []
+        for line in self.text.decode().splitlines():
+            index, _, text = line.partition(' ')
+            index = int(index)
+            selections.append(((index if index >= 0 else None), text.strip()))
+        return selections
+
 
 class MenuItem:
+    __slots__ = ('text', 'icon', 'meta', 'nonselectable', 'info', 'permanent')
+
     def __init__(self, text,
                  icon=None,
                  meta=None,
@@ -49,6 +78,59 @@ class MenuItem:
             return self.text.encode()
 
 
+class RowTable:
+    """
+    Rows written to rofi, in rofi's row order, stored as two columns:
+    the encoded row, and the value the row stands for, e.g. its MenuItem or entry.
+    Menus with many rows can encode them directly and skip building an item per row.
+    """
+    def __init__(self):
+        self.rows: list[bytes] = []
+        self.values: list[Any] = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index: int) -> Any:
+        return self.values[index]
+
+    def append(self, row: bytes, value: Any = None):
+        self.rows.append(row)
+        self.values.append(value)
+
+    def extend(self, rows: Iterable[tuple[bytes, Any]]):
+        for row, value in rows:
+            self.rows.append(row)
+            self.values.append(value)
+
+    def encode(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """
+        The given rows, ready to write to rofi's stdin.
+        """
+        rows = self.rows[start:end]
+        return b'\n'.join(rows) + b'\n' if rows else b''
+
+
+class ProcessLauncher:
+    """
+    Runs rofi as a local subprocess, exec'd directly rather than through a shell.
+    The executable can be swapped out, e.g. for a scripted stand-in without a display.
+    """
+    def __init__(self, executable: str = 'rofi'):
+        self.executable = executable
+
+    async def launch(self, argv: list[str]) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            self.executable, *argv[1:],
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+
+    async def close(self):
+        # Each rofi is done with once its menu reads the response
+        pass
+
+
 class Menu:
     def __init__(self,
                  separator=None,
@@ -75,6 +157,8 @@ class Menu:
                  filter=None,
                  matching=None,
                  tokenize=None,
+                 async_pre_read=None,
+                 launcher=None,
                  ):
 
          self.separator = separator
@@ -101,10 +185,15 @@ class Menu:
          self.filter = filter
          self.matching=matching
          self.tokenize=tokenize
+         self.async_pre_read = async_pre_read
 
          self.keymap = {}
 
-         self.process: Optional[asyncio.Process] = None
+         self.launcher = launcher if launcher is not None else ProcessLauncher()
+         self.process: Optional[asyncio.subprocess.Process] = None
+         self._launching: Optional[asyncio.Task] = None
+         # Rows written to the current process, mapping rofi's row indices back to their values
+         self.items = RowTable()
 
     def options(self):
         raw = [
@@ -132,36 +221,109 @@ class Menu:
                 ('-filter', self.filter),
                 ('-tokenize', self.tokenize),
                 ('-matching', self.matching),
+                ('-async-pre-read', self.async_pre_read),
         ]
-        options = list(itertools.chain(*((opt, f"\"{val}\"" if not isinstance(val, bool) else str(val).lower()) for opt, val in raw if val is not None)))
+        options = []
+        for opt, val in raw:
+            if isinstance(val, bool):
+                # Flags take no value
+                if val:
+                    options.append(opt)
+            elif val is not None:
+                options.extend((opt, str(val)))
         for i, key in enumerate(self.keymap.values()):
             options.extend((f"-kb-custom-{i+1}", key))
 
         return options
 
-    async def display(self):
+    def command(self) -> list[str]:
+        return ['rofi', '-dmenu', *self.options()]
 
-        command = ' '.join(('rofi -dmenu', *self.options())),
-        print(f"{command=}")
+    async def display(self):
+        command = self.command()
+        logger.debug("Launching %s", command)
         if self.process is not None:
-            await self.process.terminate()
+            self.process.terminate()
             self.process = None
 
-        self.process = await asyncio.create_subprocess_shell(
-            ' '.join(('rofi -dmenu', *self.options())),
-            stdin=asyncio.subprocess.PIPE,
-            stdout=asyncio.subprocess.PIPE,
-        )
+        with tracing.span('rofi.spawn'):
+            self.process = await self.launcher.launch(command)
+        self.items = RowTable()
+
+    async def launch(self):
+        """
+        Start displaying the menu without waiting for rofi to be up.
+
+        Rofi is forked before this returns, so the caller can prepare the rows
+        while the window is created. Writing items or reading the response
+        waits for the launch to complete.
+        """
+        self._launching = asyncio.create_task(self.display())
+        # A single pass of the loop takes the launch as far as forking rofi
+        await asyncio.sleep(0)
+
+    async def _launched(self):
+        if self._launching is not None:
+            launching, self._launching = self._launching, None
+            await launching
 
     async def write_items(self, *items: MenuItem):
+        await self._launched()
+        if self.process is None:
+            raise ValueError("Menu cannot write items before displaying.")
+        start = len(self.items)
+        self.items.extend((item.formatted(), item) for item in items)
+        self.process.stdin.write(self.items.encode(start))
+        if not start:
+            tracing.mark('rofi.first_row')
+
+    async def stream_items(self, items: Iterable[MenuItem], chunksize=256) -> int:
+        """
+        Write items to rofi as they are produced, a chunk at a time.
+        See `stream_rows`.
+        """
+        return await self.stream_rows(((item.formatted(), item) for item in items), chunksize)
+
+    async def stream_rows(self, rows: Iterable[tuple[bytes, Any]], chunksize=256) -> int:
+        """
+        Write encoded rows to rofi as they are produced, a chunk at a time,
+        recording the value each row stands for.
+        Waits for rofi to take each chunk before producing the next,
+        and closes stdin once every row is written so rofi knows the list is complete.
+
+        Returns the number of rows written,
+        which is short if rofi exited (e.g. on a selection) before reading them all.
+        """
+        await self._launched()
         if self.process is None:
             raise ValueError("Menu cannot write items before displaying.")
-        self.process.stdin.writelines(item.formatted() + b'\n' for item in items)
+        stdin = self.process.stdin
+        table = self.items
+        rows = iter(rows)
+        written = 0
+        try:
+            while True:
+                start = len(table)
+                table.extend(itertools.islice(rows, chunksize))
+                if len(table) == start:
+                    break
+                stdin.write(table.encode(start))
+                if not start:
+                    tracing.mark('rofi.first_row')
+                written += len(table) - start
+                await stdin.drain()
+            stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        return written
 
     async def read(self):
+        await self._launched()
         if self.process is None:
             raise ValueError("Menu cannot read before displaying.")
-        stdout, _ = await self.process.communicate()
+        # Rofi answers once the user is done with it
+        with tracing.span('rofi.think'):
+            stdout, _ = await self.process.communicate()
         response = RofiResponse(stdout, self.process.returncode, None)
         self.process = None
         return response
@@ -0,0 +1,137 @@
+"""
+Persistent cache of rendered TrackMenu rows.
+
+Almost every row in the track menu is a historical entry which never changes,
+so the expensive part of each row (escaping, timezone conversion, formatting)
+is cached by entry id and only redone when the entry or its project changes.
+The row index and the date column depend on the row's position, so they are
+still filled in when the menu is built.
+"""
+import json
+import os
+from typing import Optional
+
+from .store import EntryRecord
+
+
+CACHE_VERSION = 1
+
+# Rendered parts of a row: (local date, description and project columns, times)
+Row = tuple[str, str, str]
+
+
+def entry_stamp(entry: EntryRecord) -> Optional[tuple]:
+    """
+    Identify the version of an entry a cached row was rendered from.
+    Entries which can't be versioned, or which change every launch, give None.
+    """
+    if entry.running or entry.at is None:
+        return None
+    project = entry.project
+    if project is not None:
+        return (entry.at.timestamp(), project.name, project.colour)
+    return (entry.at.timestamp(), None, None)
+
+
+class RowCache:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.timezone: Optional[str] = None
+        self.desc_width = 0
+        self.proj_width = 0
+        self.rows: dict[int, tuple[tuple, Row]] = {}
+        self.dirty = False
+
+    def clear(self):
+        self.rows.clear()
+        self.dirty = True
+
+    def prepare(self, timezone: str, entries: list[EntryRecord]) -> tuple[int, int]:
+        """
+        Check the cache against the display settings and the entries about to be rendered.
+        Returns the description and project column widths to render with.
+
+        The cached widths already cover every cached row,
+        so only new or changed entries need measuring.
+        If a column has to grow, the cached rows are padded wrongly and are dropped.
+        """
+        if timezone != self.timezone:
+            self.clear()
+            self.timezone = timezone
+            self.desc_width = self.proj_width = 0
+
+        desc_width = self.desc_width
+        proj_width = self.proj_width
+        for entry in entries:
+            cached = self.rows.get(entry.id)
+            if cached is not None and cached[0] == entry_stamp(entry):
+                continue
+            desc_width = max(desc_width, len(entry.description or 'No Description'))
+            proj_width = max(proj_width, len(entry.project.name if entry.project else 'No Project'))
+
+        if (desc_width, proj_width) != (self.desc_width, self.proj_width):
+            self.clear()
+            self.desc_width = desc_width
+            self.proj_width = proj_width
+
+        if len(self.rows) > len(entries):
+            # Forget rows for entries which no longer exist
+            live = {entry.id for entry in entries}
+            for entryid in [entryid for entryid in self.rows if entryid not in live]:
+                del self.rows[entryid]
+            self.dirty = True
+
+        return desc_width, proj_width
+
+    def get(self, entry: EntryRecord) -> Optional[Row]:
+        cached = self.rows.get(entry.id)
+        if cached is not None:
+            stamp, row = cached
+            if stamp is not None and stamp == entry_stamp(entry):
+                return row
+        return None
+
+    def put(self, entry: EntryRecord, row: Row):
+        if (stamp := entry_stamp(entry)) is not None:
+            self.rows[entry.id] = (stamp, row)
+            self.dirty = True
+
+    def save(self):
+        if self.path is None or not self.dirty:
+            return
+        data = {
+            'version': CACHE_VERSION,
+            'timezone': self.timezone,
+            'desc_width': self.desc_width,
+            'proj_width': self.proj_width,
+            'rows': [[entryid, *stamp, *row] for entryid, (stamp, row) in self.rows.items()],
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmppath = self.path + '.tmp'
+        with open(tmppath, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmppath, self.path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str) -> 'RowCache':
+        """
+        Load the cache at the given path, or start an empty cache if it is missing or unusable.
+        """
+        cache = cls(path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') != CACHE_VERSION:
+                return cache
+            rows = {
+                entryid: ((at, pname, pcolour), (date, body, times))
+                for entryid, at, pname, pcolour, date, body, times in data['rows']
+            }
+            cache.timezone = data['timezone']
+            cache.desc_width = data['desc_width']
+            cache.proj_width = data['proj_width']
+            cache.rows = rows
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return cache
@@ -0,0 +1,308 @@
+"""
+Rate limited scheduling of API requests.
+
+Toggl answers 429 to clients sending faster than about a request a second.
+Requests are paced with a token bucket and served by lane, mutations first,
+then interactive reads, then background syncs. Identical GETs in flight are
+shared, and throttled requests retried after the Retry-After or a jittered backoff.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+from .lib import utc_now
+from .session import HTTPSession
+
+logger = logging.getLogger(__name__)
+
+# Lanes, served in this order
+MUTATION, INTERACTIVE, BACKGROUND = range(3)
+LANE_NAMES = ('mutation', 'interactive', 'background')
+
+# Toggl asks for no more than a request a second, sustained
+DEFAULT_RATE = 1.0
+# Requests which can go out at once after a quiet spell, enough for a sync
+DEFAULT_BURST = 10
+# Attempts after the first for a throttled request
+DEFAULT_RETRIES = 4
+# Backoff before the first retry, doubling each time, in seconds
+BASE_DELAY = 0.5
+MAX_DELAY = 60.0
+# Statuses worth retrying. Any request the API throttled can be retried,
+# other failures only for reads, since a mutation may have been applied
+RETRY_ANY = {429}
+RETRY_READS = {502, 503, 504}
+
+_lane: contextvars.ContextVar[int] = contextvars.ContextVar('toggl_rofi_lane', default=INTERACTIVE)
+
+
+def use_lane(lane: int):
+    """
+    Set the lane of reads made by the current task and the tasks it starts.
+    """
+    _lane.set(lane)
+
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header, given in seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - utc_now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class APIResponse:
+    """
+    Status and decoded body of a response, which can be shared between callers.
+    """
+    __slots__ = ('status', 'data')
+
+    def __init__(self, status: int, data: Any):
+        self.status = status
+        self.data = data
+
+
+class LaneStats:
+    def __init__(self):
+        self.requests = 0
+        # Seconds spent waiting for a token
+        self.waited = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float):
+        self.requests += 1
+        self.waited += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def to_data(self) -> dict:
+        return {
+            'requests': self.requests,
+            'mean_wait': self.waited / self.requests if self.requests else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+
+class Flight:
+    """
+    A GET in flight, shared by every caller making the same request.
+    """
+    __slots__ = ('task', 'lane', 'waiter')
+
+    def __init__(self, lane: int):
+        self.task: Optional[asyncio.Task] = None
+        # Best lane among its callers
+        self.lane = lane
+        # Future handed a token when its turn comes, while the request is queued
+        self.waiter: Optional[asyncio.Future] = None
+
+
+class RequestScheduler:
+    def __init__(self, http: HTTPSession, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 retries: int = DEFAULT_RETRIES):
+        self.http = http
+        # Requests a second, no pacing at all if not positive
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.retries = retries
+
+        self.tokens = float(self.burst)
+        self._updated: Optional[float] = None
+        # No tokens are handed out before this loop time, after being throttled
+        self._paused_until = 0.0
+        # Requests waiting for a token, as (lane, sequence, future)
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatching: Optional[asyncio.TimerHandle] = None
+        # GETs in flight, by method, url and parameters
+        self._inflight: dict[tuple, Flight] = {}
+        self.rand = random.Random()
+
+        self.lanes = [LaneStats() for _ in LANE_NAMES]
+        self.coalesced = 0
+        self.retried = 0
+        self.throttled = 0
+
+    # Token bucket
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take(self) -> bool:
+        now = asyncio.get_running_loop().time()
+        if now < self._paused_until:
+            return False
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def _schedule(self):
+        if self._dispatching is not None or not self._waiters:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        delay = max(self._paused_until - now, 0.0)
+        if self.rate > 0:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+        self._dispatching = loop.call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        self._dispatching = None
+        waiters = self._waiters
+        while waiters:
+            if waiters[0][2].done():
+                # Cancelled while waiting
+                heapq.heappop(waiters)
+                continue
+            if not self._take():
+                break
+            heapq.heappop(waiters)[2].set_result(None)
+        self._schedule()
+
+    async def _acquire(self, lane: int, flight: Optional[Flight] = None):
+        if not self._waiters and self._take():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane, next(self._sequence), future))
+        self._schedule()
+        if flight is not None:
+            flight.waiter = future
+        try:
+            await future
+        finally:
+            if flight is not None:
+                flight.waiter = None
+
+    def _promote(self, flight: Flight, lane: int):
+        """
+        Move a shared GET up to a better lane, when a caller in that lane joins it.
+        """
+        if lane >= flight.lane:
+            return
+        flight.lane = lane
+        if flight.waiter is not None and not flight.waiter.done():
+            # Queued again ahead, whichever entry comes up first hands it the token
+            heapq.heappush(self._waiters, (lane, next(self._sequence), flight.waiter))
+            if self._dispatching is not None:
+                self._dispatching.cancel()
+                self._dispatching = None
+            self._schedule()
+
+    def pause(self, delay: float):
+        """
+        Hand out no tokens for the next `delay` seconds, e.g. after being throttled.
+        """
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + delay)
+        # A single request may try again once the pause is over, then the rest are paced
+        self.tokens = 1.0
+        self._updated = self._paused_until
+        if self._dispatching is not None:
+            self._dispatching.cancel()
+            self._dispatching = None
+        self._schedule()
+
+    def backoff(self, attempt: int, after: Optional[float]) -> float:
+        """
+        Seconds to wait before retrying: at least what the API asked for,
+        or an exponential backoff with full jitter, so throttled clients spread out.
+        """
+        delay = self.rand.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+        if after is not None:
+            delay = min(after, MAX_DELAY) + delay / 4
+        return delay
+
+    # Requests
+
+    async def _send(self, method: str, url: str, lane: int, flight: Optional[Flight] = None,
+                    **kwargs) -> APIResponse:
+        loop = asyncio.get_running_loop()
+        retry = RETRY_ANY | RETRY_READS if method == 'GET' else RETRY_ANY
+        attempt = 0
+        while True:
+            if flight is not None:
+                lane = flight.lane
+            queued = loop.time()
+            await self._acquire(lane, flight)
+            if flight is not None:
+                # May have been promoted while queued
+                lane = flight.lane
+            self.lanes[lane].record(loop.time() - queued)
+
+            async with self.http.request(method, url, **kwargs) as resp:
+                if resp.status not in retry or attempt >= self.retries:
+                    if resp.content_type == 'application/json':
+                        return APIResponse(resp.status, await resp.json())
+                    return APIResponse(resp.status, await resp.text())
+                after = retry_after(resp.headers.get('Retry-After'))
+
+            delay = self.backoff(attempt, after)
+            attempt += 1
+            self.retried += 1
+            if resp.status == 429:
+                # Every lane has to back off, not just this request
+                self.throttled += 1
+                self.pause(delay)
+            logger.info("%s %s answered %d, retrying in %.2fs.", method, url, resp.status, delay)
+            await asyncio.sleep(delay)
+
+    async def request(self, method: str, url: str, lane: Optional[int] = None, **kwargs) -> APIResponse:
+        """
+        Make a request once the lane's turn comes, retrying if it is throttled.
+        Mutations use the mutation lane, reads the lane of the context unless given.
+        """
+        if lane is None:
+            lane = _lane.get() if method == 'GET' else MUTATION
+        if method != 'GET':
+            return await self._send(method, url, lane, **kwargs)
+
+        key = (method, url, tuple(sorted((kwargs.get('params') or {}).items())))
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._inflight[key] = Flight(lane)
+            flight.task = asyncio.create_task(self._send(method, url, lane, flight, **kwargs))
+            flight.task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            self._promote(flight, lane)
+        # One caller giving up mustn't cancel the request for the rest
+        return await asyncio.shield(flight.task)
+
+    def stats(self) -> dict:
+        return {
+            'coalesced': self.coalesced,
+            'retried': self.retried,
+            'throttled': self.throttled,
+            **{name: lane.to_data() for name, lane in zip(LANE_NAMES, self.lanes)},
+        }
+
+    async def close(self):
+        if self._dispatching is not None:
+            self._dispatching.cancel()
+            self._dispatching = None
+        for _, _, future in self._waiters:
+            future.cancel()
+        self._waiters.clear()
+        # Shared GETs outlive their callers, and would fail once the session is closed
+        tasks = [flight.task for flight in self._inflight.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,36 @@
+"""
+Rofi script mode helper, run by path each time the user acts in the menu.
+
+Passes what rofi told it to the toggl-rofi process over the Unix socket
+named in the environment, and prints back the rows of the next menu.
+"""
+import json
+import os
+import socket
+import sys
+
+
+def main():
+    path = os.environ.get('TOGGL_ROFI_SCRIPT_SOCKET')
+    if not path:
+        return
+    request = {
+        'retv': int(os.environ.get('ROFI_RETV', 0)),
+        'arg': sys.argv[1] if len(sys.argv) > 1 else None,
+        'info': os.environ.get('ROFI_INFO'),
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            sock.shutdown(socket.SHUT_WR)
+            while chunk := sock.recv(65536):
+                sys.stdout.buffer.write(chunk)
+    except OSError:
+        # Nobody is holding the menus any more, printing nothing closes rofi
+        return
+    sys.stdout.buffer.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+"""
+Rofi script mode backend, keeping a single rofi window up across nested menus.
+
+Rofi is started once with `scripthelper` as its script, which asks this process
+over a Unix socket for the rows of the next menu each time the user acts.
+Menus see the same process-like interface as with the other launchers.
+Script mode can't do everything dmenu does:
+    - rows are handed over once the menu has written them all, rather than streamed
+    - there is no filter text, so `-filter` only stands in for the 'f' format field
+    - `-multi-select` picks a single row
+    - custom keybindings are fixed when rofi starts, so each key is given a slot
+      the first time a menu binds it, and mapped back to the menu's own numbering.
+      Keys first bound after rofi is up only work from the next rofi started.
+"""
+import asyncio
+import json
+import logging
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+MODE_NAME = 'toggl'
+# Tells the helper where to ask for rows
+SOCKET_ENV = 'TOGGL_ROFI_SCRIPT_SOCKET'
+HELPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripthelper.py')
+
+# Rows are delimited by this rather than newlines, so messages can span lines
+DELIM = b'\x1e'
+# dmenu options which take no value
+FLAGS = {'-i', '-only-match', '-no-custom', '-markup-rows', '-multi-select', '-sync', '-keep-right', '-tokenize'}
+# Options which apply to the whole rofi instance, taken from the menu starting it
+GLOBAL_OPTIONS = ('-i', '-matching', '-tokenize', '-l', '-w')
+# Rofi's custom keybinding slots
+MAX_KEYS = 19
+
+# ROFI_RETV values
+RETV_INITIAL, RETV_SELECTED, RETV_CUSTOM = 0, 1, 2
+RETV_KEY = 10
+
+# Seconds to wait for rofi to close once there is nothing left to show
+CLOSE_TIMEOUT = 2
+
+
+def parse_options(argv: list[str]) -> dict[str, str | bool]:
+    """
+    The options of a `rofi -dmenu` command line, flags mapping to True.
+    """
+    options = {}
+    args = iter(argv[1:])
+    for arg in args:
+        if arg in FLAGS:
+            options[arg] = True
+        elif arg.startswith('-') and arg != '-dmenu':
+            options[arg] = next(args, '')
+    return options
+
+
+def menu_keys(options: dict) -> list[str]:
+    """
+    The keys bound by a menu, in order of its -kb-custom-N options.
+    """
+    keys = []
+    for i in range(1, MAX_KEYS + 1):
+        key = options.get(f'-kb-custom-{i}')
+        if key is None:
+            break
+        keys.append(key)
+    return keys
+
+
+class ScriptCall:
+    """
+    A run of the helper by rofi, waiting for the rows to show next.
+    """
+    def __init__(self, retv: int, arg: Optional[str], info: Optional[str]):
+        self.retv = retv
+        self.arg = arg
+        self.info = info
+        self.answer: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+
+    def __repr__(self):
+        return f"<ScriptCall {self.retv=} {self.arg=} {self.info=}>"
+
+    def reply(self, data: bytes):
+        if not self.answer.done():
+            self.answer.set_result(data)
+
+
+class ScriptPipe:
+    """
+    Collects the rows a menu writes, until it closes the pipe.
+    """
+    def __init__(self, process: 'ScriptProcess'):
+        self.process = process
+
+    def write(self, data: bytes):
+        self.process.data += data
+
+    def writelines(self, lines):
+        self.write(b''.join(lines))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.process.complete.set()
+
+
+class ScriptProcess:
+    """
+    Process-like stand-in for a menu shown in the shared rofi.
+    """
+    def __init__(self, launcher: 'ScriptLauncher', options: dict):
+        self.launcher = launcher
+        self.options = options
+        self.keys = menu_keys(options)
+        self.stdin = ScriptPipe(self)
+        self.data = b''
+        # Set once every row is written
+        self.complete = asyncio.Event()
+        self.response: asyncio.Future[tuple[bytes, int]] = asyncio.get_running_loop().create_future()
+        self.returncode = None
+
+    def encode(self, first: bool) -> bytes:
+        """
+        The rows written so far, with the menu's options, as the helper's output.
+        """
+        options = self.options
+        modeopts = {
+            'prompt': options.get('-p', MODE_NAME),
+            'message': options.get('-mesg', ''),
+            'markup-rows': 'true' if options.get('-markup-rows') else 'false',
+            'no-custom': 'true' if options.get('-no-custom') else 'false',
+            'active': options.get('-a', ''),
+            'urgent': options.get('-u', ''),
+            'use-hot-keys': 'true',
+        }
+        lines = [b'\x00' + name.encode() + b'\x1f' + value.encode() for name, value in modeopts.items()]
+
+        sep = options.get('-sep', '\n').encode()
+        rows = self.data.split(sep)
+        if rows and not rows[-1]:
+            rows.pop()
+        for i, row in enumerate(rows):
+            # Row options follow a NUL, separated by unit separators
+            info = b'info\x1f' + str(i).encode()
+            lines.append(row + (b'\x1f' if b'\x00' in row else b'\x00') + info)
+
+        # The delimiter is only set on the first call, rofi remembers it after
+        header = b'\x00delim\x1f' + DELIM + b'\n' if first else b''
+        return header + DELIM.join(lines) + DELIM
+
+    def respond(self, call: Optional[ScriptCall]) -> bool:
+        """
+        Answer the menu with what the user did, as rofi -dmenu would have.
+        None means rofi exited, e.g. the user cancelled.
+        Returns False if the call isn't meant for this menu, i.e. a key it doesn't bind.
+        """
+        if call is None:
+            self._finish(b'', 1)
+            return True
+
+        code = 0
+        if call.retv >= RETV_KEY:
+            key = self.launcher.keys[call.retv - RETV_KEY]
+            if key not in self.keys:
+                return False
+            code = RETV_KEY + self.keys.index(key)
+        elif call.retv not in (RETV_SELECTED, RETV_CUSTOM):
+            return False
+
+        text = call.arg or ''
+        index = int(call.info) if call.info and call.retv != RETV_CUSTOM else -1
+        filtertext = text if index < 0 else self.options.get('-filter', '')
+        fields = {
+            's': text,
+            'i': str(index),
+            'd': str(index + 1 if index >= 0 else 0),
+            'q': shlex.quote(text),
+            'f': filtertext,
+            'F': shlex.quote(filtertext),
+        }
+        output = ''.join(fields.get(c, c) for c in self.options.get('-format', 's'))
+        self._finish((output + '\n').encode(), code)
+        return True
+
+    def _finish(self, stdout: bytes, code: int):
+        if not self.response.done():
+            self.response.set_result((stdout, code))
+
+    async def communicate(self):
+        # Like a subprocess, reading the response closes stdin
+        self.stdin.close()
+        stdout, self.returncode = await self.response
+        return stdout, None
+
+    def terminate(self):
+        self.launcher.abandon(self)
+
+
+class ScriptLauncher:
+    """
+    Shows every menu in one rofi, run in script mode, starting it again if it exits.
+    """
+    def __init__(self, executable: str = 'rofi', keys: Iterable[str] = ()):
+        self.executable = executable
+        # Custom keybinding slots of the rofi, each menu's keys are mapped onto these
+        self.keys: list[str] = list(dict.fromkeys(keys))
+
+        self.rofi: Optional[asyncio.subprocess.Process] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.socketdir: Optional[str] = None
+        # Calls from the helper, None once rofi has exited
+        self.calls: asyncio.Queue[Optional[ScriptCall]] = asyncio.Queue()
+        # A call owed the rows of the next menu launched
+        self.held: Optional[ScriptCall] = None
+        # Whether rofi has been given the row delimiter
+        self.delimited = False
+        # Menu currently being shown, and the task showing it
+        self.process: Optional[ScriptProcess] = None
+        self.task: Optional[asyncio.Task] = None
+        self._watching: Optional[asyncio.Task] = None
+
+    async def launch(self, argv: list[str]) -> ScriptProcess:
+        options = parse_options(argv)
+        for key in menu_keys(options):
+            if key not in self.keys:
+                if len(self.keys) >= MAX_KEYS:
+                    logger.warning("No keybinding slot left for %s", key)
+                    continue
+                if self.rofi is not None and self.rofi.returncode is None:
+                    logger.warning("%s is only bound once rofi is started again", key)
+                self.keys.append(key)
+
+        if self.rofi is None or self.rofi.returncode is not None:
+            await self._start(options)
+        if self.task is not None:
+            self.task.cancel()
+
+        process = self.process = ScriptProcess(self, options)
+        self.task = asyncio.create_task(self._show(process))
+        return process
+
+    def abandon(self, process: ScriptProcess):
+        if process is self.process and self.task is not None:
+            self.task.cancel()
+
+    async def _start(self, options: dict):
+        if self.server is None:
+            self.socketdir = tempfile.mkdtemp(prefix='toggl-rofi-')
+            self.server = await asyncio.start_unix_server(
+                self._handle, os.path.join(self.socketdir, 'script.sock')
+            )
+        # Calls left over from a previous rofi are never answered
+        self.calls = asyncio.Queue()
+        self.held = None
+        self.delimited = False
+
+        # -S skips site, the helper only needs the standard library
+        script = shlex.join([sys.executable, '-S', HELPER])
+        argv = [self.executable, '-show', MODE_NAME, '-modi', f"{MODE_NAME}:{script}"]
+        for name in GLOBAL_OPTIONS:
+            value = options.get(name)
+            if value is True:
+                argv.append(name)
+            elif value is not None:
+                argv.extend((name, value))
+        for i, key in enumerate(self.keys):
+            argv.extend((f"-kb-custom-{i+1}", key))
+        logger.debug("Starting script mode rofi %s", argv)
+
+        self.rofi = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            env=os.environ | {SOCKET_ENV: os.path.join(self.socketdir, 'script.sock')},
+        )
+        self._watching = asyncio.create_task(self._watch(self.rofi, self.calls))
+
+    async def _watch(self, rofi: asyncio.subprocess.Process, calls: asyncio.Queue):
+        await rofi.wait()
+        calls.put_nowait(None)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = json.loads(await reader.readline())
+            call = ScriptCall(request['retv'], request.get('arg'), request.get('info'))
+            logger.debug("Script call %r", call)
+            self.calls.put_nowait(call)
+            writer.write(await call.answer)
+            await writer.drain()
+        except (ValueError, KeyError, ConnectionError):
+            logger.exception("Bad script mode call.")
+        finally:
+            writer.close()
+
+    async def _show(self, process: ScriptProcess):
+        """
+        Answer rofi's next call with the menu's rows, then the menu with the call after.
+        """
+        while True:
+            call = self.held or await self.calls.get()
+            self.held = None
+            if call is None:
+                process.respond(None)
+                return
+            try:
+                await process.complete.wait()
+            except asyncio.CancelledError:
+                # Still owed rows, by the next menu
+                self.held = call
+                raise
+            call.reply(process.encode(first=not self.delimited))
+            self.delimited = True
+
+            # The call after says what the user did with them
+            call = await self.calls.get()
+            if call is None:
+                process.respond(None)
+                return
+            # Answered with the next menu's rows, or these again if the menu ignores it
+            self.held = call
+            if process.respond(call):
+                return
+
+    async def close(self):
+        """
+        Show the last menu launched if it was never read, e.g. an error message,
+        until the user is done with it, then let rofi close and stop listening.
+        """
+        process, task = self.process, self.task
+        if task is not None and not task.done():
+            if not process.complete.is_set():
+                process.stdin.close()
+                await process.response
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        if self.held is not None:
+            # Answering with no rows closes rofi
+            self.held.reply(b'')
+            self.held = None
+        if self.rofi is not None and self.rofi.returncode is None:
+            try:
+                await asyncio.wait_for(self.rofi.wait(), CLOSE_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.rofi.terminate()
+        if self._watching is not None:
+            await asyncio.gather(self._watching, return_exceptions=True)
+
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.socketdir is not None:
+            shutil.rmtree(self.socketdir, ignore_errors=True)
+            self.socketdir = None
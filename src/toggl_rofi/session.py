@@ -0,0 +1,102 @@
+"""
+Pooled HTTP session for the API client.
+
+A single session is kept for the life of the client, with its connections kept
+alive between requests, so back to back calls such as a sync followed by
+starting an entry only pay for DNS, TCP and TLS setup once.
+Resolved addresses are cached for the same reason, which matters most to the daemon.
+
+aiohttp is slow to import, so it is imported in a worker thread the first time
+the session is needed, and the event loop is left free to get rofi up meanwhile.
+"""
+import asyncio
+import base64
+import contextlib
+import importlib
+from typing import Optional
+
+from . import tracing
+
+
+# Seconds an idle connection is kept open, long enough to outlast the user picking an entry
+DEFAULT_KEEPALIVE = 60
+# Seconds resolved addresses are cached
+DEFAULT_DNS_TTL = 300
+
+
+class HTTPSession:
+    def __init__(self, login: Optional[str] = None, password: str = 'api_token',
+                 keepalive: float = DEFAULT_KEEPALIVE, dns_ttl: float = DEFAULT_DNS_TTL):
+        self.login = login
+        self.password = password
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+
+        self.session = None
+        self._opening: Optional[asyncio.Task] = None
+        # Connections opened and requests made, to see how well connections are reused
+        self.connections = 0
+        self.requests = 0
+
+    async def __aenter__(self) -> 'HTTPSession':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _open(self):
+        aiohttp = await asyncio.to_thread(importlib.import_module, 'aiohttp')
+
+        async def on_connection_create_end(session, context, params):
+            self.connections += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        connector = aiohttp.TCPConnector(
+            keepalive_timeout=self.keepalive,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_ttl,
+        )
+        headers = {}
+        if self.login is not None:
+            # Rather than aiohttp's deprecated BasicAuth
+            credentials = base64.b64encode(f"{self.login}:{self.password}".encode()).decode('ascii')
+            headers['Authorization'] = f"Basic {credentials}"
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=headers,
+            trace_configs=[trace_config],
+        )
+
+    async def open(self):
+        """
+        Open the session, if it isn't already, returning the underlying aiohttp session.
+        Concurrent callers share the same session.
+        """
+        if self.session is None:
+            if self._opening is None:
+                self._opening = asyncio.create_task(self._open())
+            try:
+                await asyncio.shield(self._opening)
+            except Exception:
+                # Let the next request try again
+                self._opening = None
+                raise
+        return self.session
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        session = await self.open()
+        self.requests += 1
+        async with session.request(method, url, **kwargs) as resp:
+            yield resp
+
+    async def close(self):
+        if self._opening is not None and not self._opening.done():
+            # Closing before the first request finished opening the session
+            await asyncio.gather(self._opening, return_exceptions=True)
+        if self.session is not None:
+            tracing.mark('http.close', connections=self.connections, requests=self.requests)
+            await self.session.close()
+            self.session = None
+        self._opening = None
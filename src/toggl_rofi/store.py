@@ -0,0 +1,386 @@
+"""
+Local copy of the Toggl state that the menus render from.
+
+The store holds plain records built from the API data,
+so it can be written to the cache directory after a sync and read back
+on the next launch. This lets the menu draw straight away from the
+snapshot while a fresh sync runs in the background.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from .completion import CompletionIndex, frecency_weight
+from .lib import utc_now
+from .tasks import TaskIndex
+from .totals import DailyTotals, header_start
+
+
+SNAPSHOT_VERSION = 1
+
+
+def dump_time(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def load_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    # The API uses a trailing Z, which fromisoformat only accepts from 3.11
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
+
+
+# workspace_id -> casefolded name -> records with that name
+NameIndex = dict[int, dict[str, list]]
+
+
+def _index_name(index: NameIndex, record):
+    index.setdefault(record.workspace_id, {}).setdefault(record.name.casefold(), []).append(record)
+
+
+def _unindex_name(index: NameIndex, record):
+    names = index[record.workspace_id]
+    key = record.name.casefold()
+    names[key].remove(record)
+    if not names[key]:
+        del names[key]
+
+
+def _lookup_name(index: NameIndex, name: str, workspace_id: Optional[int]) -> list:
+    key = name.casefold()
+    if workspace_id is not None:
+        return list(index.get(workspace_id, {}).get(key, ()))
+    return [record for names in index.values() for record in names.get(key, ())]
+
+
+class ProjectRecord:
+    def __init__(self, id: int, workspace_id: int, client_id: Optional[int], name: str, colour: str):
+        self.id = id
+        self.workspace_id = workspace_id
+        self.client_id = client_id
+        self.name = name
+        self.colour = colour
+
+    @classmethod
+    def from_data(cls, data: dict):
+        return cls(
+            data['id'], data['workspace_id'], data.get('client_id'), data['name'], data.get('color')
+        )
+
+    def to_data(self):
+        return {
+            'id': self.id,
+            'workspace_id': self.workspace_id,
+            'client_id': self.client_id,
+            'name': self.name,
+            'color': self.colour,
+        }
+
+
+class TagRecord:
+    def __init__(self, id: int, workspace_id: int, name: str):
+        self.id = id
+        self.workspace_id = workspace_id
+        self.name = name
+
+    @classmethod
+    def from_data(cls, data: dict):
+        return cls(data['id'], data['workspace_id'], data['name'])
+
+    def to_data(self):
+        return {'id': self.id, 'workspace_id': self.workspace_id, 'name': self.name}
+
+
+class EntryRecord:
+    def __init__(self, id: int, workspace_id: int, project_id: Optional[int],
+                 description: Optional[str], start: datetime, stop: Optional[datetime],
+                 duration: int, tags: list[str], tag_ids: list[int], at: Optional[datetime]):
+        self.id = id
+        self.workspace_id = workspace_id
+        self.project_id = project_id
+        self.description = description
+        self.start = start
+        self.stop = stop
+        self.duration = duration
+        self.tags = tags
+        self.tag_ids = tag_ids
+        self.at = at
+
+        # Linked by the owning LocalState
+        self.project: Optional[ProjectRecord] = None
+
+    @property
+    def running(self) -> bool:
+        return self.stop is None
+
+    @property
+    def actual_duration(self) -> float:
+        if self.stop is None:
+            return (utc_now() - self.start).total_seconds()
+        return (self.stop - self.start).total_seconds()
+
+    @classmethod
+    def from_data(cls, data: dict):
+        return cls(
+            data['id'],
+            data['workspace_id'],
+            data.get('project_id'),
+            data.get('description'),
+            load_time(data['start']),
+            load_time(data.get('stop')),
+            data.get('duration') or 0,
+            list(data.get('tags') or ()),
+            list(data.get('tag_ids') or ()),
+            load_time(data.get('at')),
+        )
+
+    def to_data(self):
+        return {
+            'id': self.id,
+            'workspace_id': self.workspace_id,
+            'project_id': self.project_id,
+            'description': self.description,
+            'start': dump_time(self.start),
+            'stop': dump_time(self.stop),
+            'duration': self.duration,
+            'tags': self.tags,
+            'tag_ids': self.tag_ids,
+            'at': dump_time(self.at),
+        }
+
+
+class LocalState:
+    """
+    Serialisable mirror of the parts of the client state used by the menus.
+    """
+    def __init__(self, profile_id: Optional[int] = None, timezone: Optional[str] = None,
+                 workspace_id: Optional[int] = None, synced_at: Optional[datetime] = None,
+                 cursor: Optional[datetime] = None, history_start: Optional[datetime] = None):
+        self.profile_id = profile_id
+        self.timezone = timezone
+        self.workspace_id = workspace_id
+        self.synced_at = synced_at
+        # Server time up to which the store is known to be complete
+        self.cursor = cursor
+        # Start of the loaded history, entries before this may be missing
+        self.history_start = history_start
+
+        self.projects: dict[int, ProjectRecord] = {}
+        self.tags: dict[int, TagRecord] = {}
+        self.time_entries: dict[int, EntryRecord] = {}
+
+        self._project_names: NameIndex = {}
+        self._tag_names: NameIndex = {}
+        # Indexes over the entries, built on first use and kept up to date after that
+        self._totals: Optional[DailyTotals] = None
+        self._tasks: Optional[TaskIndex] = None
+        self._project_completions: Optional[CompletionIndex] = None
+        self._tag_completions: Optional[CompletionIndex] = None
+
+    def add_project(self, project: ProjectRecord):
+        self.remove_project(project.id)
+        self.projects[project.id] = project
+        _index_name(self._project_names, project)
+        if self._project_completions is not None:
+            self._project_completions.add(project.id, project.name, project)
+
+    def remove_project(self, projectid: int):
+        if (project := self.projects.pop(projectid, None)) is not None:
+            _unindex_name(self._project_names, project)
+            if self._project_completions is not None:
+                self._project_completions.remove(projectid)
+
+    def add_tag(self, tag: TagRecord):
+        self.remove_tag(tag.id)
+        self.tags[tag.id] = tag
+        _index_name(self._tag_names, tag)
+        if self._tag_completions is not None:
+            self._tag_completions.add(tag.id, tag.name, tag)
+
+    def remove_tag(self, tagid: int):
+        if (tag := self.tags.pop(tagid, None)) is not None:
+            _unindex_name(self._tag_names, tag)
+            if self._tag_completions is not None:
+                self._tag_completions.remove(tagid)
+
+    def find_projects(self, name: str, workspace_id: Optional[int] = None) -> list[ProjectRecord]:
+        """
+        Case-insensitively find the projects with the given name,
+        optionally restricted to a single workspace.
+        """
+        return _lookup_name(self._project_names, name, workspace_id)
+
+    def find_tags(self, name: str, workspace_id: Optional[int] = None) -> list[TagRecord]:
+        return _lookup_name(self._tag_names, name, workspace_id)
+
+    def add_entry(self, entry: EntryRecord):
+        entry.project = self.projects.get(entry.project_id) if entry.project_id is not None else None
+        self.time_entries[entry.id] = entry
+        if self._totals is not None:
+            self._totals.add(entry)
+        if self._tasks is not None:
+            self._tasks.add(entry)
+        if self._project_completions is not None:
+            self._count_use(entry)
+
+    def remove_entry(self, entryid: int):
+        self.time_entries.pop(entryid, None)
+        if self._totals is not None:
+            self._totals.remove(entryid)
+        if self._tasks is not None:
+            self._tasks.remove(entryid)
+        if self._project_completions is not None:
+            self._project_completions.remove_use(entryid)
+            self._tag_completions.remove_use(entryid)
+
+    def _count_use(self, entry: EntryRecord):
+        weight = frecency_weight(entry.start)
+        self._project_completions.add_use(
+            entry.id, (entry.project_id,) if entry.project_id is not None else (), weight
+        )
+        self._tag_completions.add_use(entry.id, entry.tag_ids, weight)
+
+    @property
+    def totals(self) -> DailyTotals:
+        """
+        Daily totals of the stored entries over the days the track menu header shows,
+        in the profile timezone.
+        """
+        tz = ZoneInfo(self.timezone or 'UTC')
+        # The header only moves forward from here, so the days covered stay enough
+        if self._totals is None or self._totals.tz != tz:
+            self._totals = DailyTotals(tz, header_start(utc_now().astimezone(tz).date()))
+            for entry in self.time_entries.values():
+                self._totals.add(entry)
+        return self._totals
+
+    @property
+    def tasks(self) -> TaskIndex:
+        """
+        The stored entries grouped into distinct tasks.
+        """
+        if self._tasks is None:
+            self._tasks = TaskIndex()
+            for entry in self.time_entries.values():
+                self._tasks.add(entry)
+        return self._tasks
+
+    def _build_completions(self):
+        self._project_completions = CompletionIndex()
+        for project in self.projects.values():
+            self._project_completions.add(project.id, project.name, project)
+        self._tag_completions = CompletionIndex()
+        for tag in self.tags.values():
+            self._tag_completions.add(tag.id, tag.name, tag)
+        for entry in self.time_entries.values():
+            self._count_use(entry)
+
+    @property
+    def project_completions(self) -> CompletionIndex:
+        """
+        Project names ranked by how often and how recently the stored entries used them.
+        """
+        if self._project_completions is None:
+            self._build_completions()
+        return self._project_completions
+
+    @property
+    def tag_completions(self) -> CompletionIndex:
+        if self._tag_completions is None:
+            self._build_completions()
+        return self._tag_completions
+
+    def merge(self, projects: list[dict] = [], tags: list[dict] = [], time_entries: list[dict] = []):
+        """
+        Merge changed objects from the API into the store.
+        Objects marked as deleted by the API are removed.
+        """
+        changed_projects = set()
+        for pdata in projects:
+            changed_projects.add(pdata['id'])
+            if pdata.get('server_deleted_at'):
+                self.remove_project(pdata['id'])
+            else:
+                self.add_project(ProjectRecord.from_data(pdata))
+
+        for tdata in tags:
+            if tdata.get('deleted_at'):
+                self.remove_tag(tdata['id'])
+            else:
+                self.add_tag(TagRecord.from_data(tdata))
+
+        if changed_projects:
+            # Relink entries to the replaced project records
+            for entry in self.time_entries.values():
+                if entry.project_id in changed_projects:
+                    entry.project = self.projects.get(entry.project_id)
+
+        for edata in time_entries:
+            if edata.get('server_deleted_at'):
+                self.remove_entry(edata['id'])
+            else:
+                self.add_entry(EntryRecord.from_data(edata))
+
+    def to_data(self):
+        return {
+            'version': SNAPSHOT_VERSION,
+            'profile_id': self.profile_id,
+            'timezone': self.timezone,
+            'workspace_id': self.workspace_id,
+            'synced_at': dump_time(self.synced_at),
+            'cursor': dump_time(self.cursor),
+            'history_start': dump_time(self.history_start),
+            'projects': [project.to_data() for project in self.projects.values()],
+            'tags': [tag.to_data() for tag in self.tags.values()],
+            'time_entries': [entry.to_data() for entry in self.time_entries.values()],
+        }
+
+    @classmethod
+    def from_data(cls, data: dict):
+        state = cls(
+            profile_id=data['profile_id'],
+            timezone=data['timezone'],
+            workspace_id=data['workspace_id'],
+            synced_at=load_time(data['synced_at']),
+            cursor=load_time(data.get('cursor')),
+            history_start=load_time(data.get('history_start')),
+        )
+        for pdata in data['projects']:
+            state.add_project(ProjectRecord.from_data(pdata))
+        for tdata in data['tags']:
+            state.add_tag(TagRecord.from_data(tdata))
+        for edata in data['time_entries']:
+            state.add_entry(EntryRecord.from_data(edata))
+        return state
+
+    def save(self, path: str):
+        """
+        Atomically write the snapshot to the given path.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = path + '.tmp'
+        with open(tmppath, 'w') as f:
+            json.dump(self.to_data(), f)
+        os.replace(tmppath, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['LocalState']:
+        """
+        Read a snapshot written by `save`.
+        Returns None if there is no usable snapshot at the path.
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != SNAPSHOT_VERSION:
+            return None
+        try:
+            return cls.from_data(data)
+        except (KeyError, TypeError, ValueError):
+            return None
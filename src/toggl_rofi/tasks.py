@@ -0,0 +1,104 @@
+"""
+Distinct tasks in the entry history, for the recent tasks menu.
+
+Entries are grouped into tasks by description, project and tags,
+each with how often and when it was last used, and the time tracked on it.
+"""
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
+
+from .completion import frecency_weight
+
+if TYPE_CHECKING:
+    from .store import EntryRecord
+
+
+# description, project_id and the set of tag ids
+TaskKey = tuple[str, Optional[int], frozenset[int]]
+
+
+def task_key(entry: 'EntryRecord') -> TaskKey:
+    return (entry.description or '', entry.project_id, frozenset(entry.tag_ids))
+
+
+class Task:
+    def __init__(self, key: TaskKey):
+        self.key = key
+        # Every entry of the task, by id
+        self.entries: dict[int, 'EntryRecord'] = {}
+        # Tracked seconds of the stopped entries
+        self.duration = 0.0
+        self.frecency = 0.0
+        # The most recently started entry, continued when the task is picked
+        self.entry: Optional['EntryRecord'] = None
+
+    @property
+    def count(self) -> int:
+        return len(self.entries)
+
+    @property
+    def last_used(self) -> datetime:
+        return self.entry.start
+
+    @property
+    def running(self) -> bool:
+        return self.entry.running
+
+    def total(self) -> float:
+        """
+        Total tracked time, including any running entry.
+        """
+        if self.entry.running:
+            return self.duration + self.entry.actual_duration
+        return self.duration
+
+
+class TaskIndex:
+    def __init__(self):
+        self.tasks: dict[TaskKey, Task] = {}
+        # Entry id -> (task key, seconds it added, frecency it added)
+        self.contributions: dict[int, tuple[TaskKey, float, float]] = {}
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def add(self, entry: 'EntryRecord'):
+        self.remove(entry.id)
+        key = task_key(entry)
+        task = self.tasks.get(key)
+        if task is None:
+            task = self.tasks[key] = Task(key)
+        # Running entries are added in when read
+        seconds = 0.0 if entry.running else (entry.stop - entry.start).total_seconds()
+        weight = frecency_weight(entry.start)
+        task.entries[entry.id] = entry
+        task.duration += seconds
+        task.frecency += weight
+        if task.entry is None or entry.start >= task.entry.start:
+            task.entry = entry
+        self.contributions[entry.id] = (key, seconds, weight)
+
+    def remove(self, entryid: int):
+        contribution = self.contributions.pop(entryid, None)
+        if contribution is None:
+            return
+        key, seconds, weight = contribution
+        task = self.tasks[key]
+        del task.entries[entryid]
+        if not task.entries:
+            del self.tasks[key]
+            return
+        if len(task.entries) == 1:
+            # Take the last entry's own contribution, rather than leave rounding error behind
+            _, task.duration, task.frecency = self.contributions[next(iter(task.entries))]
+        else:
+            task.duration -= seconds
+            task.frecency -= weight
+        if task.entry.id == entryid:
+            task.entry = max(task.entries.values(), key=lambda entry: entry.start)
+
+    def ranked(self) -> list[Task]:
+        """
+        Every task, most frequently and recently used first.
+        """
+        return sorted(self.tasks.values(), key=lambda task: task.frecency, reverse=True)
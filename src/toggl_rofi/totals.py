@@ -0,0 +1,113 @@
+"""
+Running per-day, per-project totals of tracked time.
+
+The totals are updated as entries are added, changed or removed, and only
+cover the days the track menu header shows, so building them at launch only
+splits the entries of the last few weeks. Entries are split at local midnight
+in the profile timezone. Running entries are held separately and added in when read.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import TYPE_CHECKING, Iterator, Optional
+from zoneinfo import ZoneInfo
+
+if TYPE_CHECKING:
+    from .store import EntryRecord
+
+
+def split_days(start: datetime, stop: datetime, tz: ZoneInfo) -> Iterator[tuple[date, float]]:
+    """
+    Split the given period at each local midnight,
+    yielding the local date and number of seconds of each part.
+    """
+    # Differences are taken in UTC, since subtracting two times sharing
+    # a ZoneInfo ignores any DST change between them.
+    start = start.astimezone(timezone.utc)
+    stop = stop.astimezone(timezone.utc)
+    day = start.astimezone(tz).date()
+    while start < stop:
+        midnight = datetime.combine(day + timedelta(days=1), time(), tzinfo=tz).astimezone(timezone.utc)
+        end = min(midnight, stop)
+        yield day, (end - start).total_seconds()
+        start = end
+        day += timedelta(days=1)
+
+
+def header_start(today: date) -> date:
+    """
+    First day the track menu header totals, the start of the week or month, whichever is earlier.
+    """
+    return min(today.replace(day=1), today - timedelta(days=today.weekday()))
+
+
+class DailyTotals:
+    def __init__(self, tz: ZoneInfo, since: Optional[date] = None):
+        self.tz = tz
+        # Entries stopped before this local date are left out, everything is kept if None
+        self.since = since
+        self._since_time = (
+            datetime.combine(since, time(), tzinfo=tz).astimezone(timezone.utc) if since is not None else None
+        )
+        # date -> project_id -> seconds
+        self.days: defaultdict[date, defaultdict[Optional[int], float]] = defaultdict(lambda: defaultdict(float))
+        # date -> seconds, for cheap range totals
+        self.day_totals: defaultdict[date, float] = defaultdict(float)
+        # (date, project_id) -> entries adding to it, so totals are dropped exactly when their last entry goes
+        self.counts: defaultdict[tuple[date, Optional[int]], int] = defaultdict(int)
+        # What each stopped entry added, so it can be taken away again
+        self.contributions: dict[int, list[tuple[date, Optional[int], float]]] = {}
+        self.running: dict[int, 'EntryRecord'] = {}
+
+    def add(self, entry: 'EntryRecord'):
+        self.remove(entry.id)
+        if entry.running:
+            self.running[entry.id] = entry
+            return
+        if self._since_time is not None and entry.stop <= self._since_time:
+            return
+        parts = []
+        for day, seconds in split_days(entry.start, entry.stop, self.tz):
+            self.days[day][entry.project_id] += seconds
+            self.day_totals[day] += seconds
+            self.counts[day, entry.project_id] += 1
+            parts.append((day, entry.project_id, seconds))
+        self.contributions[entry.id] = parts
+
+    def remove(self, entryid: int):
+        self.running.pop(entryid, None)
+        for day, projectid, seconds in self.contributions.pop(entryid, ()):
+            projects = self.days[day]
+            self.counts[day, projectid] -= 1
+            if self.counts[day, projectid] <= 0:
+                # Rather than leave rounding error behind
+                del self.counts[day, projectid]
+                del projects[projectid]
+            else:
+                projects[projectid] -= seconds
+            self.day_totals[day] -= seconds
+            if not projects:
+                del self.days[day]
+                del self.day_totals[day]
+
+    def _running_parts(self, now: datetime) -> Iterator[tuple[date, Optional[int], float]]:
+        for entry in self.running.values():
+            for day, seconds in split_days(entry.start, now, self.tz):
+                yield day, entry.project_id, seconds
+
+    def day(self, day: date, now: datetime) -> dict[Optional[int], float]:
+        """
+        Time tracked per project on the given local date.
+        """
+        projects = dict(self.days.get(day, {}))
+        for rday, projectid, seconds in self._running_parts(now):
+            if rday == day:
+                projects[projectid] = projects.get(projectid, 0) + seconds
+        return projects
+
+    def total(self, start: date, end: date, now: datetime) -> float:
+        """
+        Total time tracked between the given local dates, inclusive.
+        """
+        total = sum(self.day_totals.get(start + timedelta(days=i), 0) for i in range((end - start).days + 1))
+        total += sum(seconds for day, _, seconds in self._running_parts(now) if start <= day <= end)
+        return total
@@ -0,0 +1,135 @@
+"""
+Timing spans for the phases of a launch.
+
+The trace is written to the cache directory once the launch is done, as plain JSON,
+and optionally in the Chrome trace event format. Spans are recorded against the trace
+of the current context, so background tasks started during a launch are included.
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import os
+import time
+from typing import Optional
+
+
+TRACE_VERSION = 1
+
+_current: contextvars.ContextVar[Optional['Trace']] = contextvars.ContextVar('toggl_rofi_trace', default=None)
+_untraced = contextlib.nullcontext()
+
+
+class Trace:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.origin = time.perf_counter()
+        # Each span is (name, start, duration, track, args), times in seconds from the origin.
+        # Instant events have no duration.
+        self.spans: list[tuple[str, float, Optional[float], int, dict]] = []
+        # asyncio task -> track number, so concurrent spans are kept apart
+        self._tracks: dict[Optional[asyncio.Task], int] = {}
+
+    def now(self) -> float:
+        return time.perf_counter() - self.origin
+
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return self._tracks.setdefault(task, len(self._tracks))
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        start = self.now()
+        track = self._track()
+        try:
+            yield
+        finally:
+            self.spans.append((name, start, self.now() - start, track, args))
+
+    def mark(self, name: str, **args):
+        self.spans.append((name, self.now(), None, self._track(), args))
+
+    def totals(self) -> dict[str, float]:
+        """
+        Total time spent in each named span, in seconds.
+        """
+        totals = {}
+        for name, _, duration, _, _ in self.spans:
+            if duration is not None:
+                totals[name] = totals.get(name, 0) + duration
+        return totals
+
+    def to_data(self) -> dict:
+        return {
+            'version': TRACE_VERSION,
+            'name': self.name,
+            'started': self.started,
+            'duration': self.now(),
+            'totals': self.totals(),
+            'spans': [
+                {'name': name, 'start': start, 'duration': duration, 'track': track, 'args': args}
+                for name, start, duration, track, args in self.spans
+            ],
+        }
+
+    def to_chrome(self) -> dict:
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': f"toggl-rofi {self.name}"}}
+        ]
+        for name, start, duration, track, args in self.spans:
+            event = {'name': name, 'ts': start * 1e6, 'pid': os.getpid(), 'tid': track, 'args': args}
+            if duration is None:
+                event.update(ph='i', s='t')
+            else:
+                event.update(ph='X', dur=duration * 1e6)
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self, path: Optional[str] = None, chrome_path: Optional[str] = None):
+        """
+        Atomically write the trace to the given paths, skipping any which are None.
+        """
+        for target, data in ((path, self.to_data), (chrome_path, self.to_chrome)):
+            if target is None:
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmppath = target + '.tmp'
+            with open(tmppath, 'w') as f:
+                json.dump(data(), f)
+            os.replace(tmppath, target)
+
+
+def start(name: str) -> Trace:
+    """
+    Start a new trace for the current context and the tasks it creates from now on.
+    """
+    trace = Trace(name)
+    _current.set(trace)
+    return trace
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def span(name: str, **args):
+    """
+    Context manager timing its body as a span of the current trace, if there is one.
+    """
+    trace = _current.get()
+    if trace is None:
+        return _untraced
+    return trace.span(name, **args)
+
+
+def mark(name: str, **args):
+    """
+    Record an instant event in the current trace, if there is one.
+    """
+    trace = _current.get()
+    if trace is not None:
+        trace.mark(name, **args)
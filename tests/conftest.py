@@ -0,0 +1,49 @@
+import asyncio
+import contextlib
+import inspect
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+from fake_api import FakeToggl
+from synthetic import make_account
+from toggl_rofi.client import RofiTrackClient
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """
+    Run coroutine tests in a fresh event loop, without needing a plugin.
+    """
+    if inspect.iscoroutinefunction(pyfuncitem.obj):
+        args = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+        asyncio.run(pyfuncitem.obj(**args))
+        return True
+
+
+@contextlib.asynccontextmanager
+async def serve_fake_client(fake: FakeToggl, **kwargs):
+    """
+    A client talking to the fake API, served for as long as the context.
+    """
+    server = TestServer(fake.app())
+    await server.start_server()
+    try:
+        kwargs.setdefault('rate', 0)
+        async with RofiTrackClient(apikey='test', api_base=str(server.make_url('/api/v9')), **kwargs) as client:
+            yield client
+    finally:
+        await server.close()
+
+
+@pytest.fixture
+def fake_client():
+    """
+    Opens a client talking to the given fake API, e.g. `async with fake_client(fake) as client:`.
+    """
+    return serve_fake_client
+
+
+@pytest.fixture
+def account():
+    return make_account(projects=10, tags=5, entries=200, seed=1)
@@ -0,0 +1,203 @@
+import datetime as dt
+
+import pytest
+from aiohttp import web
+
+from fake_api import FakeToggl
+from synthetic import iso
+from toggl_rofi.client import AmbiguousNameError, APIError
+from toggl_rofi.store import ProjectRecord, TagRecord
+from toggl_rofi.lib import utc_now
+
+
+async def test_full_sync_loads_history_window(fake_client, account):
+    fake = FakeToggl(account)
+    async with fake_client(fake, history_days=3) as client:
+        await client.refresh()
+        store = client.store
+        assert store.profile_id == account['me']['id']
+        assert store.workspace_id == account['me']['default_workspace_id']
+        assert set(store.projects) == {p['id'] for p in account['projects']}
+        assert set(store.tags) == {t['id'] for t in account['tags']}
+
+        # Clear of the window edge, which moves while the test runs
+        cutoff = utc_now() - dt.timedelta(days=3)
+        inside = {e['id'] for e in account['time_entries'] if e['start'] > iso(cutoff + dt.timedelta(minutes=1))}
+        assert inside and inside <= set(store.time_entries)
+        assert all(entry.start >= cutoff - dt.timedelta(minutes=1) for entry in store.time_entries.values())
+
+
+async def test_incremental_sync_merges_changes_since_cursor(fake_client, account):
+    fake = FakeToggl(account)
+    async with fake_client(fake) as client:
+        await client.refresh()
+        cursor = client.store.cursor
+        newest = max(client.store.time_entries.values(), key=lambda e: e.start)
+        oldest = min(client.store.time_entries.values(), key=lambda e: e.start)
+
+        fake.entries[oldest.id]['server_deleted_at'] = fake.entries[oldest.id]['at'] = iso(fake.now())
+        fake.entries[newest.id]['description'] = 'renamed'
+        fake.entries[newest.id]['at'] = iso(fake.now())
+        fake.counts.clear()
+
+        await client.refresh()
+        assert oldest.id not in client.store.time_entries
+        assert client.store.time_entries[newest.id].description == 'renamed'
+        assert client.store.cursor > cursor
+        # Only the three changed-since requests, no profile fetch
+        assert fake.counts['GET /api/v9/me'] == 0
+        assert fake.counts['GET /api/v9/me/time_entries'] == 1
+
+
+async def test_rejected_cursor_falls_back_to_full_sync(fake_client, account):
+    class RejectingToggl(FakeToggl):
+        async def get_time_entries(self, request):
+            if 'since' in request.query:
+                return web.Response(status=400, text="since is too old")
+            return await super().get_time_entries(request)
+
+    fake = RejectingToggl(account)
+    async with fake_client(fake) as client:
+        await client.refresh()
+        fake.counts.clear()
+        await client.refresh()
+        # Fell back to the full sync, which fetches the profile again
+        assert fake.counts['GET /api/v9/me'] == 1
+        assert client.store.time_entries
+
+
+async def test_stale_cursor_runs_full_sync(fake_client, account):
+    fake = FakeToggl(account)
+    async with fake_client(fake) as client:
+        await client.refresh()
+        client.store.cursor -= client.max_cursor_age + dt.timedelta(days=1)
+        fake.counts.clear()
+        await client.refresh()
+        assert fake.counts['GET /api/v9/me'] == 1
+        assert client.store.cursor > utc_now() - dt.timedelta(minutes=10)
+
+
+async def test_load_history_extends_window(fake_client, account):
+    fake = FakeToggl(account)
+    async with fake_client(fake, history_days=2) as client:
+        await client.refresh()
+        loaded = len(client.store.time_entries)
+        start = client.store.history_start - dt.timedelta(days=2)
+        fetched = await client.load_history(start)
+        assert fetched > 0
+        assert len(client.store.time_entries) == loaded + fetched
+        assert client.store.history_start == start
+
+
+async def test_request_raises_api_error(fake_client, account):
+    fake = FakeToggl(account)
+    async with fake_client(fake) as client:
+        with pytest.raises(APIError) as info:
+            await client.request('GET', '/me/time_entries/1')
+        assert info.value.status == 404
+
+
+class RefusingToggl(FakeToggl):
+    """
+    Refuses every new entry, as for a workspace the user can't track in.
+    """
+    async def create_time_entry(self, request):
+        return web.Response(status=400, text="Workspace not found")
+
+
+async def test_refused_start_is_rolled_back(fake_client, account):
+    fake = RefusingToggl(account)
+    async with fake_client(fake) as client:
+        await client.refresh()
+        running = next(entry for entry in client.store.time_entries.values() if entry.running)
+
+        record = await client.start_time_entry(client.store.workspace_id, "new task")
+        assert record.id < 0
+        # Applied straight away, stopping the running entry
+        assert not running.running
+
+        # Settled as a conflict, so nothing is left pending
+        assert await client.wait_flushed(timeout=5)
+        assert record.id not in client.store.time_entries
+        assert client.store.time_entries[running.id].running
+        assert [c['action']['op'] for c in client.journal.conflicts] == ['start']
+
+
+async def test_refused_stop_of_missing_entry_removes_it(fake_client, account):
+    fake = FakeToggl(account)
+    async with fake_client(fake) as client:
+        await client.refresh()
+        running = next(entry for entry in client.store.time_entries.values() if entry.running)
+        # Deleted elsewhere, and not synced yet
+        fake.entries[running.id]['server_deleted_at'] = iso(fake.now())
+
+        await client.stop_time_entry(running)
+        await client.wait_flushed(timeout=5)
+        assert not client.journal
+        assert running.id not in client.store.time_entries
+        assert client.journal.conflicts[0]['message'].startswith('404')
+
+
+async def test_refused_stop_restores_running_entry(fake_client, account):
+    class LockedToggl(FakeToggl):
+        async def update_time_entry(self, request):
+            return web.Response(status=400, text="Entry is locked")
+
+    fake = LockedToggl(account)
+    async with fake_client(fake) as client:
+        await client.refresh()
+        running = next(entry for entry in client.store.time_entries.values() if entry.running)
+
+        await client.stop_time_entry(running)
+        assert not client.store.time_entries[running.id].running
+        await client.wait_flushed(timeout=5)
+        assert not client.journal
+        assert client.store.time_entries[running.id].running
+        assert client.journal.conflicts[0]['message'] == "400: Entry is locked"
+
+
+async def test_flushed_start_replaces_provisional_entry(fake_client, account, tmp_path):
+    fake = FakeToggl(account)
+    async with fake_client(fake, snapshot_path=str(tmp_path / 'state.json')) as client:
+        await client.refresh()
+        record = await client.start_time_entry(client.store.workspace_id, "new task")
+        assert await client.wait_flushed(timeout=5)
+        assert record.id not in client.store.time_entries
+        created = max(fake.entries)
+        assert client.store.time_entries[created].description == "new task"
+
+    # Saved once the flush settled it
+    async with fake_client(fake, snapshot_path=str(tmp_path / 'state.json')) as client:
+        assert client.load_snapshot()
+        assert created in client.store.time_entries
+
+
+async def test_resolve_names_keeps_picked_records(fake_client, account):
+    fake = FakeToggl(account)
+    async with fake_client(fake) as client:
+        await client.refresh()
+        store = client.store
+        project = next(iter(store.projects.values()))
+        tag = next(iter(store.tags.values()))
+        # The same names in another workspace
+        store.add_project(ProjectRecord(-1, project.workspace_id + 1, None, project.name, project.colour))
+        store.add_tag(TagRecord(-1, tag.workspace_id + 1, tag.name))
+
+        typed = client.parse_entry(f"work @{project.name} #{tag.name}")
+        with pytest.raises(AmbiguousNameError):
+            client.resolve_names(typed)
+
+        picked = client.parse_entry(f"work @{project.name} #{tag.name}")
+        picked.project_id = project.id
+        picked.tag_ids = {tag.name.casefold(): tag.id}
+        # Edited again, with the picked names untouched
+        edited = client.parse_entry(f"more work @{project.name} #{tag.name}")
+        edited.keep_picks(picked)
+        assert client.resolve_names(edited) == (project.id, [tag.id])
+
+
+async def test_requests_authenticate_with_the_api_key(fake_client, account):
+    fake = FakeToggl(account, apikey='test')
+    async with fake_client(fake) as client:
+        await client.refresh()
+        assert client.store.profile_id == account['me']['id']
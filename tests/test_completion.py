@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+from toggl_rofi.completion import CompletionIndex, frecency_weight
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def make_index(names):
+    index = CompletionIndex()
+    for key, name in enumerate(names):
+        index.add(key, name, name)
+    return index
+
+
+def test_query_ranks_exact_then_prefix_then_words_then_substring():
+    index = make_index(["Project", "Project Work", "Side project", "Subprojects"])
+    assert index.query("project") == ["Project", "Project Work", "Side project", "Subprojects"]
+
+
+def test_query_needs_every_word():
+    index = make_index(["Client Website", "Client App", "Website Redesign"])
+    assert index.query("web cli") == ["Client Website"]
+    assert index.query("nothing") == []
+
+
+def test_query_breaks_ties_by_frecency():
+    index = make_index(["Alpha one", "Alpha two"])
+    index.add_use(1, [1], frecency_weight(NOW))
+    index.add_use(2, [0], frecency_weight(NOW - timedelta(days=60)))
+    assert index.query("alpha") == ["Alpha two", "Alpha one"]
+    assert index.query("") == ["Alpha two", "Alpha one"]
+
+    # An entry moved to the other name takes its use with it
+    index.add_use(1, [0], frecency_weight(NOW))
+    assert index.query("") == ["Alpha one", "Alpha two"]
+    index.remove_use(1)
+    index.remove_use(2)
+    assert not index.scores
+
+
+def test_remove_drops_name_from_queries():
+    index = make_index(["Research", "Reading"])
+    index.query("re")
+    index.remove(0)
+    assert index.query("re") == ["Reading"]
+    assert index.query("search") == []
+    assert len(index) == 1
+
+    # Renaming replaces the old words
+    index.add(1, "Writing", "Writing")
+    assert index.query("read") == []
+    assert index.query("writ") == ["Writing"]
@@ -0,0 +1,64 @@
+import json
+
+from toggl_rofi.journal import Journal
+
+
+def write_lines(path, lines):
+    with open(path, 'w') as f:
+        for line in lines:
+            f.write(line + '\n')
+
+
+def test_load_ignores_torn_last_line(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = Journal(path)
+    first = journal.record('start', entry_id=-1, workspace_id=1)
+    with open(path, 'a') as f:
+        # Cut short by a crash mid-write
+        f.write('{"action": {"id": "abc", "op": "st')
+
+    loaded = Journal.load(path)
+    assert list(loaded.pending) == [first['id']]
+    assert loaded.pending[first['id']]['entry_id'] == -1
+
+
+def test_load_replays_sending_and_conflicts(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = Journal(path)
+    sent = journal.record('start', entry_id=-1, workspace_id=1)
+    journal.sending(sent)
+    refused = journal.record('stop', entry_id=5, workspace_id=1)
+    journal.conflict(refused, "404: gone")
+
+    loaded = Journal.load(path)
+    assert list(loaded.pending) == [sent['id']]
+    assert loaded.pending[sent['id']]['sent'] is True
+    assert [c['message'] for c in loaded.conflicts] == ["404: gone"]
+
+
+def test_load_done_rewrites_later_provisional_ids(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    start = {'id': 'a', 'op': 'start', 'entry_id': -1, 'workspace_id': 1}
+    stop = {'id': 'b', 'op': 'stop', 'entry_id': -1, 'workspace_id': 1}
+    other = {'id': 'c', 'op': 'stop', 'entry_id': -2, 'workspace_id': 1}
+    write_lines(path, [
+        json.dumps({'action': start}),
+        json.dumps({'action': stop}),
+        json.dumps({'action': other}),
+        json.dumps({'done': 'a', 'entry_id': 1234}),
+    ])
+
+    loaded = Journal.load(path)
+    assert list(loaded.pending) == ['b', 'c']
+    assert loaded.pending['b']['entry_id'] == 1234
+    assert loaded.pending['c']['entry_id'] == -2
+
+
+def test_compacts_once_nothing_is_pending(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = Journal(path)
+    action = journal.record('start', entry_id=-1, workspace_id=1)
+    journal.done(action, 99)
+    with open(path) as f:
+        assert f.read() == ''
+    assert not Journal.load(path)
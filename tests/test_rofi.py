@@ -0,0 +1,22 @@
+from toggl_rofi.rofi import RofiResponse
+
+
+def test_selection_of_row():
+    assert RofiResponse(b'3 Some entry  @Project\n', 0, None).selection() == (3, 'Some entry  @Project')
+
+
+def test_selection_of_custom_text():
+    assert RofiResponse(b'-1 new task @proj #tag\n', 0, None).selection() == (None, 'new task @proj #tag')
+
+
+def test_selections_of_multi_select():
+    response = RofiResponse(b'0 first\n4 second row\n', 10, None)
+    assert response.selections() == [(0, 'first'), (4, 'second row')]
+
+
+def test_selections_of_custom_text():
+    assert RofiResponse(b'-1 typed\n', 0, None).selections() == [(None, 'typed')]
+
+
+def test_selections_when_cancelled():
+    assert RofiResponse(b'', 1, None).selections() == []
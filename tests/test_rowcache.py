@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from toggl_rofi.rowcache import RowCache
+from toggl_rofi.store import EntryRecord
+
+START = datetime(2024, 6, 1, 9, tzinfo=timezone.utc)
+
+
+def entry(id, description, at=START):
+    return EntryRecord(id, 1, None, description, START, START + timedelta(hours=1), 3600, [], [], at)
+
+
+def fill(cache, entries, timezone='UTC'):
+    widths = cache.prepare(timezone, entries)
+    for e in entries:
+        if cache.get(e) is None:
+            cache.put(e, ('2024-06-01', e.description, '09:00 - 10:00'))
+    return widths
+
+
+def test_unchanged_entries_keep_their_rows():
+    cache = RowCache()
+    entries = [entry(1, "short"), entry(2, "a longer one")]
+    assert fill(cache, entries) == (len("a longer one"), len("No Project"))
+    assert cache.prepare('UTC', entries) == (len("a longer one"), len("No Project"))
+    assert all(cache.get(e) is not None for e in entries)
+
+
+def test_changed_entry_misses_without_dropping_the_rest():
+    cache = RowCache()
+    entries = [entry(1, "short"), entry(2, "a longer one")]
+    fill(cache, entries)
+    edited = entry(1, "edited", at=START + timedelta(minutes=5))
+    cache.prepare('UTC', [edited, entries[1]])
+    assert cache.get(edited) is None
+    assert cache.get(entries[1]) is not None
+
+
+def test_wider_entry_drops_every_row():
+    cache = RowCache()
+    entries = [entry(1, "short")]
+    fill(cache, entries)
+    wide = entry(2, "a description wider than any before")
+    assert cache.prepare('UTC', entries + [wide])[0] == len(wide.description)
+    assert cache.get(entries[0]) is None
+
+
+def test_timezone_change_drops_every_row():
+    cache = RowCache()
+    entries = [entry(1, "short")]
+    fill(cache, entries)
+    cache.prepare('Europe/London', entries)
+    assert cache.get(entries[0]) is None
+
+
+def test_forgets_entries_which_are_gone():
+    cache = RowCache()
+    entries = [entry(1, "one"), entry(2, "two")]
+    fill(cache, entries)
+    cache.prepare('UTC', entries[1:])
+    assert set(cache.rows) == {2}
+
+
+def test_running_entries_are_never_cached():
+    cache = RowCache()
+    running = EntryRecord(1, 1, None, "running", START, None, -1, [], [], START)
+    fill(cache, [running])
+    assert cache.rows == {}
+
+
+def test_rows_survive_save_and_load(tmp_path):
+    path = str(tmp_path / 'rows.json')
+    cache = RowCache(path)
+    entries = [entry(1, "one"), entry(2, "two")]
+    fill(cache, entries)
+    cache.save()
+
+    loaded = RowCache.load(path)
+    assert loaded.prepare('UTC', entries) == cache.prepare('UTC', entries)
+    assert loaded.get(entries[0]) == ('2024-06-01', 'one', '09:00 - 10:00')
@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+
+from toggl_rofi.scheduler import BACKGROUND, INTERACTIVE, MUTATION, RequestScheduler, retry_after, use_lane
+
+
+class Response:
+    content_type = 'application/json'
+
+    def __init__(self, url, status=200, headers=None):
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+
+    async def json(self):
+        return self.url
+
+
+class StubSession:
+    """
+    Answers every request straight away, recording the order they were sent in.
+    `statuses` are answered first, in order, as (status, headers).
+    """
+    def __init__(self, statuses=()):
+        self.sent = []
+        self.statuses = list(statuses)
+
+    @contextlib.asynccontextmanager
+    async def request(self, method, url, **kwargs):
+        self.sent.append((asyncio.get_running_loop().time(), method, url))
+        status, headers = self.statuses.pop(0) if self.statuses else (200, {})
+        yield Response(url, status, headers)
+
+
+async def test_lanes_are_served_in_order():
+    http = StubSession()
+    scheduler = RequestScheduler(http, rate=50, burst=1)
+    # Spend the burst, so the rest have to queue
+    await scheduler.request('GET', 'first')
+
+    background = asyncio.create_task(scheduler.request('GET', 'background', lane=BACKGROUND))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(scheduler.request('GET', 'interactive'))
+    await asyncio.sleep(0)
+    mutation = asyncio.create_task(scheduler.request('POST', 'mutation'))
+    await asyncio.gather(background, interactive, mutation)
+
+    assert [url for _, _, url in http.sent] == ['first', 'mutation', 'interactive', 'background']
+    await scheduler.close()
+
+
+async def test_lane_comes_from_the_context():
+    http = StubSession()
+    scheduler = RequestScheduler(http, rate=50, burst=1)
+    await scheduler.request('GET', 'first')
+
+    async def sync():
+        use_lane(BACKGROUND)
+        await scheduler.request('GET', 'sync')
+
+    task = asyncio.create_task(sync())
+    await asyncio.sleep(0)
+    await asyncio.gather(task, scheduler.request('GET', 'menu'))
+    assert [url for _, _, url in http.sent] == ['first', 'menu', 'sync']
+    assert scheduler.stats()['background']['requests'] == 1
+    await scheduler.close()
+
+
+async def test_coalesced_get_is_promoted_to_best_lane():
+    http = StubSession()
+    scheduler = RequestScheduler(http, rate=50, burst=1)
+    await scheduler.request('GET', 'first')
+
+    shared = asyncio.create_task(scheduler.request('GET', 'shared', lane=BACKGROUND))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(scheduler.request('GET', 'interactive', lane=INTERACTIVE))
+    await asyncio.sleep(0)
+    joined = asyncio.create_task(scheduler.request('GET', 'shared', lane=MUTATION))
+    results = await asyncio.gather(shared, interactive, joined)
+
+    assert [response.data for response in results] == ['shared', 'interactive', 'shared']
+    assert [url for _, _, url in http.sent] == ['first', 'shared', 'interactive']
+    assert scheduler.coalesced == 1
+    await scheduler.close()
+
+
+async def test_throttled_request_pauses_every_lane():
+    http = StubSession([(429, {'Retry-After': '0.2'})])
+    scheduler = RequestScheduler(http, rate=0, retries=2)
+    scheduler.rand.seed(0)
+    loop = asyncio.get_running_loop()
+
+    started = loop.time()
+    throttled = asyncio.create_task(scheduler.request('POST', 'throttled'))
+    await asyncio.sleep(0.05)
+    # Made during the pause, so held until it is over
+    other = await scheduler.request('GET', 'other')
+    await throttled
+
+    assert other.data == 'other'
+    times = {url: sent for sent, _, url in http.sent}
+    assert times['other'] - started >= 0.2
+    assert times['throttled'] - started >= 0.2
+    assert scheduler.throttled == 1 and scheduler.retried == 1
+    await scheduler.close()
+
+
+async def test_gives_up_after_retries():
+    http = StubSession([(429, {'Retry-After': '0'})] * 3)
+    scheduler = RequestScheduler(http, rate=0, retries=2)
+    response = await scheduler.request('POST', 'throttled')
+    assert response.status == 429
+    assert len(http.sent) == 3
+    await scheduler.close()
+
+
+async def test_close_cancels_shared_gets():
+    http = StubSession()
+    scheduler = RequestScheduler(http, rate=1, burst=1)
+    await scheduler.request('GET', 'first')
+    waiter = asyncio.create_task(scheduler.request('GET', 'queued'))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await scheduler.close()
+    assert not scheduler._inflight
+    assert [url for _, _, url in http.sent] == ['first']
+
+
+def test_retry_after_parses_seconds_and_dates():
+    assert retry_after('3') == 3.0
+    assert retry_after(None) is None
+    assert retry_after('soon') is None
+    assert retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
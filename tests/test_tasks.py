@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+from toggl_rofi.completion import frecency_weight
+from toggl_rofi.store import EntryRecord
+from toggl_rofi.tasks import TaskIndex, task_key
+
+
+def entry(id, start, stop, description="work", project_id=None):
+    duration = int((stop - start).total_seconds()) if stop is not None else -1
+    return EntryRecord(id, 1, project_id, description, start, stop, duration, [], [], None)
+
+
+def test_tasks_group_entries():
+    start = datetime(2024, 6, 3, 9, 0, tzinfo=timezone.utc)
+    index = TaskIndex()
+    index.add(entry(1, start, start + timedelta(hours=1)))
+    index.add(entry(2, start + timedelta(days=1), start + timedelta(days=1, hours=2)))
+    index.add(entry(3, start, start + timedelta(hours=1), description="other"))
+
+    first, second = index.ranked()
+    assert first.count == 2 and first.entry.id == 2 and first.total() == 3 * 3600
+    assert second.key == task_key(second.entry) == ("other", None, frozenset()) and second.count == 1
+
+
+def test_task_removal_leaves_no_rounding_error():
+    # 0.1 + 0.2 - 0.1 isn't quite 0.2
+    start = datetime(2024, 6, 3, 9, 0, tzinfo=timezone.utc)
+    later = start + timedelta(days=30)
+    index = TaskIndex()
+    index.add(entry(1, start, start + timedelta(milliseconds=100)))
+    index.add(entry(2, later, later + timedelta(milliseconds=200)))
+    index.add(entry(3, start, start + timedelta(milliseconds=300)))
+    index.remove(1)
+    index.remove(3)
+    (task,) = index.ranked()
+    assert task.duration == 0.2
+    assert task.frecency == frecency_weight(later)
+
+    index.remove(2)
+    assert not index.tasks and not index.contributions
@@ -0,0 +1,75 @@
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from toggl_rofi.store import EntryRecord
+from toggl_rofi.totals import DailyTotals, split_days
+
+LONDON = ZoneInfo('Europe/London')
+
+
+def entry(id, start, stop, project_id=None):
+    duration = int((stop - start).total_seconds()) if stop is not None else -1
+    return EntryRecord(id, 1, project_id, "", start, stop, duration, [], [], None)
+
+
+def test_split_days_at_local_midnight():
+    start = datetime(2024, 6, 1, 22, 0, tzinfo=LONDON)
+    stop = datetime(2024, 6, 2, 2, 0, tzinfo=LONDON)
+    assert list(split_days(start, stop, LONDON)) == [(date(2024, 6, 1), 7200.0), (date(2024, 6, 2), 7200.0)]
+
+
+def test_split_days_across_spring_forward():
+    # Clocks go forward at 01:00 UTC on the 31st of March 2024, so the day is 23 hours long
+    start = datetime(2024, 3, 30, 12, 0, tzinfo=LONDON)
+    stop = datetime(2024, 4, 1, 12, 0, tzinfo=LONDON)
+    parts = list(split_days(start, stop, LONDON))
+    assert parts == [
+        (date(2024, 3, 30), 12 * 3600.0),
+        (date(2024, 3, 31), 23 * 3600.0),
+        (date(2024, 4, 1), 12 * 3600.0),
+    ]
+    assert sum(seconds for _, seconds in parts) == (stop - start.astimezone(timezone.utc)).total_seconds()
+
+
+def test_split_days_across_fall_back():
+    # Clocks go back at 01:00 UTC on the 27th of October 2024, so the day is 25 hours long
+    start = datetime(2024, 10, 26, 23, 30, tzinfo=LONDON)
+    stop = datetime(2024, 10, 28, 0, 30, tzinfo=LONDON)
+    assert list(split_days(start, stop, LONDON)) == [
+        (date(2024, 10, 26), 1800.0),
+        (date(2024, 10, 27), 25 * 3600.0),
+        (date(2024, 10, 28), 1800.0),
+    ]
+
+
+def test_totals_follow_changes():
+    totals = DailyTotals(LONDON)
+    start = datetime(2024, 6, 3, 9, 0, tzinfo=LONDON)
+    totals.add(entry(1, start, start + timedelta(hours=2), project_id=10))
+    totals.add(entry(2, start + timedelta(hours=3), start + timedelta(hours=4)))
+    now = start + timedelta(hours=8)
+    assert totals.day(date(2024, 6, 3), now) == {10: 7200.0, None: 3600.0}
+
+    totals.add(entry(1, start, start + timedelta(hours=1), project_id=10))
+    totals.remove(2)
+    assert totals.total(date(2024, 6, 3), date(2024, 6, 3), now) == 3600.0
+
+
+def test_totals_skip_entries_before_since():
+    totals = DailyTotals(LONDON, since=date(2024, 6, 1))
+    totals.add(entry(1, datetime(2024, 5, 30, 9, tzinfo=LONDON), datetime(2024, 5, 30, 10, tzinfo=LONDON)))
+    totals.add(entry(2, datetime(2024, 5, 31, 23, tzinfo=LONDON), datetime(2024, 6, 1, 1, tzinfo=LONDON)))
+    assert 1 not in totals.contributions
+    assert totals.day(date(2024, 6, 1), datetime(2024, 6, 2, tzinfo=LONDON)) == {None: 3600.0}
+
+
+def test_totals_drop_days_exactly_when_emptied():
+    # 0.1 + 0.2 - 0.1 - 0.2 leaves a little over zero behind
+    start = datetime(2024, 6, 3, 9, 0, tzinfo=timezone.utc)
+    totals = DailyTotals(timezone.utc)
+    totals.add(entry(1, start, start + timedelta(milliseconds=100)))
+    totals.add(entry(2, start, start + timedelta(milliseconds=200)))
+    totals.remove(1)
+    assert totals.days[date(2024, 6, 3)] == {None: 0.2 + 0.1 - 0.1}
+    totals.remove(2)
+    assert not totals.days and not totals.day_totals and not totals.counts
@@ -0,0 +1,257 @@
+"""
+Benchmarks for the menu rendering and parsing hot paths.
+
+Builds synthetic accounts of increasing size, and times each phase of
+rendering the track menu from the local store, along with the parsing and
+lookup paths used when an entry is typed in.
+Every phase is timed as the best of several runs, and then run once more
+under tracemalloc for its peak memory, so the timings aren't skewed by tracing.
+
+Usage: python tools/benchmark.py [--size NAME ...] [--runs N] [--json PATH]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from toggl_rofi.client import RofiTrackClient  # noqa: E402
+from toggl_rofi.lib import pango_escape  # noqa: E402
+from toggl_rofi.menus import TrackMenu  # noqa: E402
+from toggl_rofi.rofi import MenuItem, RowTable  # noqa: E402
+from toggl_rofi.rowcache import RowCache  # noqa: E402
+from toggl_rofi.store import LocalState  # noqa: E402
+
+from synthetic import make_account  # noqa: E402
+
+
+# name -> account arguments
+SIZES = {
+    'small': {'projects': 100, 'tags': 50, 'entries': 1_000},
+    'medium': {'projects': 2_000, 'tags': 500, 'entries': 50_000},
+    'large': {'projects': 10_000, 'tags': 2_000, 'entries': 250_000, 'workspaces': 4},
+    'huge': {'projects': 50_000, 'tags': 5_000, 'entries': 1_000_000, 'workspaces': 10},
+}
+DEFAULT_SIZES = ['small', 'medium']
+
+# Operations per run of the per-call phases
+LOOKUPS = 1_000
+
+
+def build_state(account: dict) -> LocalState:
+    me = account['me']
+    state = LocalState(profile_id=me['id'], timezone=me['timezone'], workspace_id=me['default_workspace_id'])
+    state.merge(projects=account['projects'], tags=account['tags'], time_entries=account['time_entries'])
+    return state
+
+
+class Bench:
+    def __init__(self, account: dict):
+        self.account = account
+        self.state = build_state(account)
+        self.client = RofiTrackClient()
+        self.client.store = self.state
+        self.entries = sorted(self.state.time_entries.values(), key=lambda e: e.start)
+
+        rand = random.Random(1)
+        projects = list(self.state.projects.values())
+        tags = list(self.state.tags.values())
+        self.project_names = [rand.choice(projects).name for _ in range(LOOKUPS)]
+        self.tag_names = [rand.choice(tags).name for _ in range(LOOKUPS)]
+        self.user_strings = [
+            f"{entry.description} @{self.project_names[i]} #{self.tag_names[i]} #{self.tag_names[-i]}"
+            for i, entry in enumerate(self.entries[:LOOKUPS])
+        ]
+        self.descriptions = [entry.description for entry in self.entries]
+        self.rows = None
+
+    def menu(self, row_cache=None) -> TrackMenu:
+        return TrackMenu(self.client, row_cache=row_cache)
+
+    # Each phase returns the number of operations it did
+
+    def phase_build_state(self):
+        build_state(self.account)
+        return len(self.account['time_entries'])
+
+    def phase_parse_entry(self):
+        for userstr in self.user_strings:
+            self.client.parse_entry(userstr)
+        return len(self.user_strings)
+
+    def phase_get_project_by_name(self):
+        for name in self.project_names:
+            self.client.get_project_by_name(name)
+        return len(self.project_names)
+
+    def phase_get_tag_by_name(self):
+        for name in self.tag_names:
+            self.client.get_tag_by_name(name)
+        return len(self.tag_names)
+
+    def phase_project_completions(self):
+        # Includes building the index and frecency scores
+        self.state._project_completions = self.state._tag_completions = None
+        self.state.project_completions
+        return 1
+
+    def phase_complete_project(self):
+        index = self.state.project_completions
+        for name in self.project_names:
+            index.query(name[:3])
+        return len(self.project_names)
+
+    def phase_complete_tag(self):
+        index = self.state.tag_completions
+        for name in self.tag_names:
+            index.query(name[:3])
+        return len(self.tag_names)
+
+    def phase_tasks(self):
+        # Includes grouping the entries into tasks
+        self.state._tasks = None
+        self.state.tasks
+        return len(self.entries)
+
+    def phase_make_task_rows(self):
+        tasks = self.state.tasks.ranked()
+        for _ in self.menu().make_task_rows(tasks):
+            pass
+        return len(tasks)
+
+    def phase_pango_escape(self):
+        for desc in self.descriptions:
+            pango_escape(desc)
+        return len(self.descriptions)
+
+    def phase_make_header_cold(self):
+        # Includes building the daily totals
+        self.state._totals = None
+        self.menu().make_header()
+        return 1
+
+    def phase_make_header_warm(self):
+        self.menu().make_header()
+        return 1
+
+    def phase_make_rows_cold(self):
+        self.rows = list(self.menu(RowCache()).make_rows(self.entries))
+        return len(self.rows)
+
+    def phase_make_rows_warm(self):
+        cache = RowCache()
+        list(self.menu(cache).make_rows(self.entries))
+        menu = self.menu(cache)
+        start = time.perf_counter()
+        self.rows = list(menu.make_rows(self.entries))
+        # Only the cached render is measured
+        return len(self.rows), time.perf_counter() - start
+
+    def phase_encode_rows(self):
+        if self.rows is None:
+            self.rows = list(self.menu(RowCache()).make_rows(self.entries))
+        table = RowTable()
+        table.extend(self.rows)
+        table.encode()
+        return len(table)
+
+    def phase_formatted_plain(self):
+        items = [MenuItem(desc) for desc in self.descriptions]
+        start = time.perf_counter()
+        for item in items:
+            item.formatted()
+        return len(items), time.perf_counter() - start
+
+
+PHASES = [name[len('phase_'):] for name in vars(Bench) if name.startswith('phase_')]
+
+
+def run_phase(func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    if isinstance(result, tuple):
+        result, elapsed = result
+    return result, elapsed
+
+
+def measure(bench: Bench, phase: str, runs: int) -> dict:
+    func = getattr(bench, 'phase_' + phase)
+    timings = []
+    for _ in range(runs):
+        gc.collect()
+        ops, elapsed = run_phase(func)
+        timings.append(elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    run_phase(func)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        'phase': phase,
+        'ops': ops,
+        'best_ms': best * 1000,
+        'median_ms': sorted(timings)[len(timings) // 2] * 1000,
+        'per_op_us': best / ops * 1e6 if ops else None,
+        'peak_kib': peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', action='append', choices=SIZES, help="Account sizes to run, repeatable.")
+    parser.add_argument('--phase', action='append', choices=PHASES, help="Phases to run, repeatable.")
+    parser.add_argument(
+        '--tasks', type=int, help="Entries repeat this many distinct tasks, rather than all being different."
+    )
+    parser.add_argument('--runs', type=int, default=5, help="Timed runs per phase, the best is reported.")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON to this path, '-' for stdout.")
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'runs': args.runs,
+        'sizes': [],
+    }
+    for size in args.size or DEFAULT_SIZES:
+        account_args = dict(SIZES[size], tasks=args.tasks) if args.tasks else SIZES[size]
+        start = time.perf_counter()
+        bench = Bench(make_account(**account_args))
+        setup = time.perf_counter() - start
+        if args.json != '-':
+            print(f"{size}: {account_args} (setup {setup:.1f}s)")
+
+        phases = []
+        for phase in args.phase or PHASES:
+            result = measure(bench, phase, args.runs)
+            phases.append(result)
+            if args.json != '-':
+                per_op = f"{result['per_op_us']:10.2f}us/op" if result['per_op_us'] is not None else ''
+                print(
+                    f"    {phase:<22} {result['best_ms']:10.2f}ms {per_op}"
+                    f" {result['peak_kib']:10.0f}KiB peak"
+                )
+        results['sizes'].append({'size': size, 'account': account_args, 'phases': phases})
+        del bench
+        gc.collect()
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
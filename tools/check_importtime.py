@@ -0,0 +1,89 @@
+"""
+Import time regression check for the toggl-rofi launch paths.
+
+Imports each launch path module in a fresh interpreter under `-X importtime`,
+and fails if the import takes longer than its budget,
+or pulls in modules which that path should only import once they are needed.
+The best of several runs is taken, to keep the check stable on a noisy machine.
+
+Usage: python tools/check_importtime.py [--runs N] [--scale FACTOR]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+# (module, budget in milliseconds, modules the import must not pull in)
+CHECKS = [
+    # Handing over to the daemon, and the missing API key error
+    ('toggl_rofi.main', 150, ('aiohttp', 'toml', 'toggl_rofi.client', 'toggl_rofi.menus')),
+    # Rendering the track menu from the snapshot
+    ('toggl_rofi.menus', 200, ('aiohttp', 'toggl_rofi.editor')),
+]
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def importtime(code: str) -> list[tuple[int, str]]:
+    """
+    Run the code in a fresh interpreter,
+    and return the cumulative time in microseconds and name of each top level import.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (SRC, env.get('PYTHONPATH'))))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env=env, capture_output=True, text=True, check=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        imports.append((int(cumulative), name))
+    return imports
+
+
+def measure(module: str, baseline: set[str]) -> tuple[float, set[str]]:
+    """
+    Returns the import time of the module in milliseconds,
+    and the names of every module imported along with it.
+    """
+    imports = importtime(f"import {module}")
+    # Top level imports have a single space of indentation
+    total = sum(
+        cumulative for cumulative, name in imports
+        if not name.startswith('  ') and name.strip() not in baseline
+    )
+    return total / 1000, {name.strip() for _, name in imports}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="Runs per module, the best is kept.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget, for slow machines.")
+    args = parser.parse_args()
+
+    baseline = {name.strip() for _, name in importtime('pass')}
+
+    failed = False
+    for module, budget, forbidden in CHECKS:
+        runs = [measure(module, baseline) for _ in range(args.runs)]
+        best = min(elapsed for elapsed, _ in runs)
+        imported = runs[0][1]
+        budget *= args.scale
+
+        status = 'ok' if best <= budget else 'OVER BUDGET'
+        print(f"{module}: {best:.1f}ms (budget {budget:.0f}ms) {status}")
+        failed |= best > budget
+        for name in forbidden:
+            if name in imported:
+                print(f"    imports {name}, which it should not need")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
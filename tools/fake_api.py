@@ -0,0 +1,310 @@
+"""
+Local stand-in for the Toggl Track v9 API.
+
+Serves a synthetic account with the endpoints toggl-rofi uses, so the whole
+launch, sync and mutation flow can be run and timed without a network or a
+real account. Latency, account size and failures are configurable.
+
+Point toggl-rofi at it with `api_base` in the [toggl] section of config.toml:
+    [toggl]
+    apikey = "fake"
+    api_base = "http://127.0.0.1:8765/api/v9"
+
+Usage: python tools/fake_api.py [--port N] [--latency MS] [--entries N] [--error-rate P] ...
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import random
+import re
+import sys
+import weakref
+from collections import Counter
+from typing import Optional
+
+from aiohttp import BasicAuth, hdrs, web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import iso, make_account  # noqa: E402
+
+
+def parse_time(value: str) -> dt.datetime:
+    if value.isdigit():
+        return dt.datetime.fromtimestamp(int(value), dt.timezone.utc)
+    return dt.datetime.fromisoformat(value.replace('Z', '+00:00').replace(' ', '+'))
+
+
+class FakeToggl:
+    def __init__(self, account: dict, apikey: Optional[str] = None,
+                 latency: float = 0, jitter: float = 0,
+                 error_rate: float = 0, error_status: int = 500, error_paths: Optional[str] = None,
+                 rate_limit: Optional[float] = None, connect_latency: float = 0, seed: int = 0):
+        self.me = account['me']
+        self.workspaces = account['workspaces']
+        self.projects = {p['id']: p for p in account['projects']}
+        self.tags = {t['id']: t for t in account['tags']}
+        self.entries = {e['id']: e for e in account['time_entries']}
+        self.next_id = max(self.entries, default=5_000_000) + 1
+
+        self.apikey = apikey
+        # Seconds added to every response, plus up to `jitter` seconds at random
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.error_paths = re.compile(error_paths) if error_paths else None
+        # Requests per second before responding 429
+        self.rate_limit = rate_limit
+        self._window_start = 0.0
+        self._window_count = 0
+        # Seconds added to the first request on each connection, standing in for DNS, TCP and TLS setup
+        self.connect_latency = connect_latency
+        self._transports: weakref.WeakSet = weakref.WeakSet()
+        self.rand = random.Random(seed)
+
+        self.counts: Counter[str] = Counter()
+
+    # Helpers
+
+    def now(self) -> dt.datetime:
+        return dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+
+    def changed_since(self, request: web.Request, items) -> list:
+        if (since := request.query.get('since')) is None:
+            return [item for item in items if not item.get('server_deleted_at') and not item.get('deleted_at')]
+        since = iso(parse_time(since))
+        return [item for item in items if (item.get('at') or '') >= since]
+
+    def find_entry(self, request: web.Request) -> dict:
+        entry = self.entries.get(int(request.match_info['entry_id']))
+        if entry is None or entry.get('server_deleted_at'):
+            raise web.HTTPNotFound(text="Time entry not found")
+        return entry
+
+    def stop_entry(self, entry: dict, stop: dt.datetime):
+        start = parse_time(entry['start'])
+        stop = max(stop, start)
+        entry['stop'] = iso(stop)
+        entry['duration'] = int((stop - start).total_seconds())
+        entry['at'] = iso(self.now())
+
+    def stop_running(self, stop: dt.datetime):
+        for entry in self.entries.values():
+            if entry['stop'] is None and not entry.get('server_deleted_at'):
+                self.stop_entry(entry, stop)
+
+    def update_entry(self, entry: dict, data: dict):
+        for key in ('description', 'project_id', 'tag_ids', 'start', 'billable'):
+            if key in data:
+                entry[key] = data[key]
+        if 'tag_ids' in data:
+            entry['tags'] = [self.tags[tid]['name'] for tid in entry['tag_ids'] if tid in self.tags]
+        if data.get('stop'):
+            self.stop_entry(entry, parse_time(data['stop']))
+        entry['at'] = iso(self.now())
+
+    # Middleware
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        self.counts[f"{request.method} {resource.canonical if resource else request.path}"] += 1
+        self.counts['total'] += 1
+        if request.path.startswith('/_fake'):
+            return await handler(request)
+
+        delay = self.latency + self.rand.uniform(0, self.jitter)
+        if request.transport not in self._transports:
+            self._transports.add(request.transport)
+            self.counts['connections'] += 1
+            delay += self.connect_latency
+        if delay:
+            await asyncio.sleep(delay)
+
+        if self.apikey is not None:
+            try:
+                auth = BasicAuth.decode(request.headers.get(hdrs.AUTHORIZATION, ''))
+            except ValueError:
+                auth = None
+            if auth is None or auth.login != self.apikey or auth.password != 'api_token':
+                raise web.HTTPForbidden(text="Incorrect username and/or password")
+
+        if self.rate_limit:
+            loop_time = asyncio.get_running_loop().time()
+            if loop_time - self._window_start >= 1:
+                self._window_start = loop_time
+                self._window_count = 0
+            self._window_count += 1
+            if self._window_count > self.rate_limit:
+                self.counts['429'] += 1
+                raise web.HTTPTooManyRequests(
+                    text="Too many requests", headers={'Retry-After': '1'}
+                )
+
+        if self.error_rate and (self.error_paths is None or self.error_paths.search(request.path)):
+            if self.rand.random() < self.error_rate:
+                self.counts['injected'] += 1
+                return web.Response(status=self.error_status, text="Injected failure")
+
+        return await handler(request)
+
+    # Endpoints
+
+    async def get_me(self, request):
+        return web.json_response(self.me)
+
+    async def get_workspaces(self, request):
+        return web.json_response(self.workspaces)
+
+    async def get_projects(self, request):
+        projects = self.changed_since(request, self.projects.values())
+        if request.query.get('include_archived') != 'true':
+            projects = [p for p in projects if p.get('active', True)]
+        return web.json_response(projects)
+
+    async def get_tags(self, request):
+        return web.json_response(self.changed_since(request, self.tags.values()))
+
+    async def get_time_entries(self, request):
+        query = request.query
+        entries = self.changed_since(request, self.entries.values())
+        if 'start_date' in query and 'end_date' in query:
+            start = parse_time(query['start_date'])
+            end = parse_time(query['end_date'])
+            entries = [e for e in entries if start <= parse_time(e['start']) < end]
+        elif 'since' not in query:
+            # Without a range the API only returns recent entries
+            start = self.now() - dt.timedelta(days=9)
+            entries = [e for e in entries if parse_time(e['start']) >= start]
+        entries.sort(key=lambda e: e['start'], reverse=True)
+        return web.json_response(entries)
+
+    async def get_current(self, request):
+        running = [e for e in self.entries.values() if e['stop'] is None and not e.get('server_deleted_at')]
+        return web.json_response(running[0] if running else None)
+
+    async def get_time_entry(self, request):
+        return web.json_response(self.find_entry(request))
+
+    async def create_time_entry(self, request):
+        data = await request.json()
+        wid = int(request.match_info['workspace_id'])
+        start = parse_time(data['start'])
+        entry = {
+            'id': self.next_id,
+            'workspace_id': wid,
+            'project_id': None,
+            'description': None,
+            'start': iso(start),
+            'stop': None,
+            'duration': -1,
+            'tags': [],
+            'tag_ids': [],
+        }
+        self.next_id += 1
+        if data.get('duration', -1) < 0 and not data.get('stop'):
+            self.stop_running(start)
+        self.update_entry(entry, {k: v for k, v in data.items() if k != 'start'})
+        if data.get('duration', -1) >= 0 and not data.get('stop'):
+            self.stop_entry(entry, start + dt.timedelta(seconds=data['duration']))
+        self.entries[entry['id']] = entry
+        return web.json_response(entry)
+
+    async def update_time_entry(self, request):
+        entry = self.find_entry(request)
+        self.update_entry(entry, await request.json())
+        return web.json_response(entry)
+
+    async def bulk_update_time_entries(self, request):
+        # A JSON patch applied to every listed entry, reporting how each went
+        data = {op['path'].strip('/'): op.get('value') for op in await request.json()}
+        success, failure = [], []
+        for entry_id in map(int, request.match_info['entry_ids'].split(',')):
+            entry = self.entries.get(entry_id)
+            if entry is None or entry.get('server_deleted_at'):
+                failure.append({'id': entry_id, 'message': "Time entry not found"})
+                continue
+            self.update_entry(entry, data)
+            success.append(entry_id)
+        return web.json_response({'success': success, 'failure': failure})
+
+    async def stop_time_entry(self, request):
+        entry = self.find_entry(request)
+        if entry['stop'] is not None:
+            raise web.HTTPConflict(text="Time entry is already stopped")
+        self.stop_entry(entry, self.now())
+        return web.json_response(entry)
+
+    async def delete_time_entry(self, request):
+        entry = self.find_entry(request)
+        entry['server_deleted_at'] = entry['at'] = iso(self.now())
+        return web.Response(status=200)
+
+    async def get_stats(self, request):
+        return web.json_response(dict(self.counts))
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.add_routes([
+            web.get('/api/v9/me', self.get_me),
+            web.get('/api/v9/me/workspaces', self.get_workspaces),
+            web.get('/api/v9/me/projects', self.get_projects),
+            web.get('/api/v9/me/tags', self.get_tags),
+            web.get('/api/v9/me/time_entries', self.get_time_entries),
+            web.get('/api/v9/me/time_entries/current', self.get_current),
+            web.get('/api/v9/me/time_entries/{entry_id:\\d+}', self.get_time_entry),
+            web.post('/api/v9/workspaces/{workspace_id:\\d+}/time_entries', self.create_time_entry),
+            web.put('/api/v9/workspaces/{workspace_id:\\d+}/time_entries/{entry_id:\\d+}', self.update_time_entry),
+            web.patch('/api/v9/workspaces/{workspace_id:\\d+}/time_entries/{entry_id:\\d+}/stop', self.stop_time_entry),
+            web.patch(
+                '/api/v9/workspaces/{workspace_id:\\d+}/time_entries/{entry_ids:[\\d,]+}', self.bulk_update_time_entries
+            ),
+            web.delete('/api/v9/workspaces/{workspace_id:\\d+}/time_entries/{entry_id:\\d+}', self.delete_time_entry),
+            web.get('/_fake/stats', self.get_stats),
+        ])
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--apikey', help="Only accept this API key, any key is accepted if unset.")
+    parser.add_argument('--projects', type=int, default=100)
+    parser.add_argument('--tags', type=int, default=50)
+    parser.add_argument('--entries', type=int, default=1000)
+    parser.add_argument('--workspaces', type=int, default=1)
+    parser.add_argument('--tasks', type=int, help="Distinct tasks the entries repeat, all different if unset.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0, help="Milliseconds added to every response.")
+    parser.add_argument(
+        '--connect-latency', type=float, default=0, help="Milliseconds added to the first request on a connection."
+    )
+    parser.add_argument('--jitter', type=float, default=0, help="Up to this many more milliseconds at random.")
+    parser.add_argument('--error-rate', type=float, default=0, help="Chance of failing a request.")
+    parser.add_argument('--error-status', type=int, default=500, help="Status of injected failures.")
+    parser.add_argument('--error-paths', help="Only inject failures for paths matching this regex.")
+    parser.add_argument('--rate-limit', type=float, help="Requests per second before responding 429.")
+    args = parser.parse_args()
+
+    account = make_account(
+        projects=args.projects, tags=args.tags, entries=args.entries,
+        workspaces=args.workspaces, seed=args.seed, tasks=args.tasks,
+    )
+    fake = FakeToggl(
+        account, apikey=args.apikey,
+        latency=args.latency / 1000, jitter=args.jitter / 1000,
+        error_rate=args.error_rate, error_status=args.error_status, error_paths=args.error_paths,
+        rate_limit=args.rate_limit, connect_latency=args.connect_latency / 1000, seed=args.seed,
+    )
+    try:
+        web.run_app(fake.app(), host=args.host, port=args.port)
+    finally:
+        print(json.dumps(dict(fake.counts), indent=2))
+
+
+if __name__ == '__main__':
+    main()
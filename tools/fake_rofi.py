@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Scripted stand-in for `rofi -dmenu`, for driving the menus without a display.
+
+Set `executable` in the [rofi] section of config.toml to this file.
+Each launch reads the rows written to it, answers with the next step of the
+script, and appends a record of what happened to the log:
+    argv, row count, time to the first row and to the -async-pre-read row,
+    time to the end of input, and the response it gave.
+Times are in seconds from when this process started,
+with absolute `started` and `first_row_at` times for comparing against the caller.
+
+The script is a JSON list of steps, one per launch, or a single step for every launch.
+A step may have:
+    "select": row index to select, or a list of them for -multi-select,
+    or "match": text the selected row contains,
+    or "text": custom input, as if typed without selecting a row.
+    "key": keybinding to press, looked up in the -kb-custom-N options to give exit code 10+,
+    or "code": exit code to give directly. "cancel": true exits 1 with no output.
+    "delay_ms": time to wait after reading the rows before answering.
+    "idle_ms": how long the input may go quiet before the rows are taken as complete,
+    since menus which read their response without closing stdin never send EOF (default 500).
+
+Run with `-modi name:command -show name` it stands in for rofi's script mode instead,
+running the command as rofi would and treating each set of rows it prints as a launch,
+until the command prints nothing or the step cancels.
+
+Environment:
+    FAKE_ROFI_SCRIPT  path of the script, every launch selects the first row without it
+    FAKE_ROFI_LOG     path of the JSON lines log, also used to count launches
+"""
+import json
+import os
+import select
+import shlex
+import subprocess
+import sys
+import time
+
+started = time.time()
+clock = time.monotonic()
+
+
+def elapsed():
+    return time.monotonic() - clock
+
+
+def option(argv: list[str], name: str, default=None):
+    if name in argv[:-1]:
+        return argv[argv.index(name) + 1]
+    return default
+
+
+def load_step(logpath):
+    scriptpath = os.environ.get('FAKE_ROFI_SCRIPT')
+    if not scriptpath:
+        return {'select': 0}
+    with open(scriptpath) as f:
+        script = json.load(f)
+    if isinstance(script, dict):
+        return script
+
+    launches = 0
+    if logpath and os.path.exists(logpath):
+        with open(logpath) as f:
+            launches = sum(1 for _ in f)
+    return script[launches] if launches < len(script) else {'cancel': True}
+
+
+def read_rows(record, pre_read, idle):
+    """
+    Read rows from stdin until EOF or until it has been idle for `idle` seconds.
+    """
+    fd = sys.stdin.fileno()
+    data = b''
+    rows = 0
+    while True:
+        ready, _, _ = select.select([fd], [], [], idle)
+        if not ready:
+            record['eof'] = False
+            break
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            record['eof'] = True
+            break
+        if not data:
+            record['first_row'] = elapsed()
+            record['first_row_at'] = time.time()
+        data += chunk
+        rows = data.count(b'\n')
+        if pre_read and 'pre_read' not in record and rows >= pre_read:
+            record['pre_read'] = elapsed()
+    record['read'] = elapsed()
+    record['rows'] = rows
+    return [row.partition(b'\x00')[0].decode() for row in data.split(b'\n')[:rows]]
+
+
+def respond(argv, step, rows):
+    """
+    Returns the output and exit code for the step.
+    """
+    if step.get('cancel'):
+        return '', 1
+
+    if 'text' in step:
+        picked = [(-1, step['text'])]
+    elif 'match' in step:
+        picked = [(i, row) for i, row in enumerate(rows) if step['match'] in row][:1]
+    else:
+        select = step.get('select', 0)
+        picked = [(index, rows[index]) for index in (select if isinstance(select, list) else [select])
+                  if index < len(rows)]
+    if not picked:
+        # Nothing to select, so like rofi given no rows, accepting exits 1 with no output
+        return '', 1
+
+    code = step.get('code', 0)
+    if 'key' in step:
+        for i in range(1, 20):
+            if option(argv, f'-kb-custom-{i}') == step['key']:
+                code = 9 + i
+                break
+        else:
+            raise SystemExit(f"fake-rofi: no -kb-custom-N is bound to {step['key']}")
+
+    lines = []
+    for index, text in picked:
+        fields = {
+            's': text,
+            'i': str(index),
+            'd': str(index + 1 if index >= 0 else 0),
+            'q': f"'{text}'",
+            'f': step.get('text', option(argv, '-filter', '')),
+            'F': f"'{step.get('text', option(argv, '-filter', ''))}'",
+        }
+        lines.append(''.join(fields.get(c, c) for c in option(argv, '-format', 's')) + '\n')
+    return ''.join(lines), code
+
+
+def parse_script_output(output: bytes, delim: bytes) -> tuple[dict, list[tuple[str, str]], bytes]:
+    """
+    Split script mode output into its mode options and its (text, info) rows,
+    returning the delimiter for the next call.
+    """
+    if output.startswith(b'\x00delim\x1f'):
+        line, _, output = output.partition(b'\n')
+        delim = line[len(b'\x00delim\x1f'):]
+    options = {}
+    rows = []
+    for entry in output.split(delim):
+        if not entry:
+            continue
+        text, _, rest = entry.partition(b'\x00')
+        if not text:
+            name, _, value = rest.partition(b'\x1f')
+            options[name.decode()] = value.decode()
+            continue
+        fields = rest.split(b'\x1f')
+        rowopts = dict(zip(fields[::2], fields[1::2]))
+        rows.append((text.decode(), rowopts.get(b'info', b'').decode()))
+    return options, rows, delim
+
+
+def script_main(argv, logpath):
+    """
+    Stand in for `rofi -show`, calling the mode's script until it has nothing left to show.
+    """
+    name = option(argv, '-show')
+    modes = dict(mode.partition(':')[::2] for mode in option(argv, '-modi', '').split(','))
+    command = shlex.split(modes[name])
+    delim = b'\n'
+    env = dict(os.environ, ROFI_RETV='0')
+    arg = []
+    while True:
+        step = load_step(logpath)
+        record = {'argv': argv, 'pid': os.getpid(), 'started': started, 'step': step}
+        called = elapsed()
+        output = subprocess.run(command + arg, env=env, stdout=subprocess.PIPE, check=True).stdout
+        record['first_row'] = record['read'] = elapsed()
+        record['first_row_at'] = time.time()
+        record['call'] = record['read'] - called
+        record['eof'] = True
+        if not output:
+            # Nothing left to show, rofi closes
+            return 0
+        options, rows, delim = parse_script_output(output, delim)
+        record['options'] = options
+        record['rows'] = len(rows)
+
+        time.sleep(step.get('delay_ms', 0) / 1000)
+        if step.get('cancel'):
+            retv, arg, info = None, [], None
+        elif 'text' in step:
+            retv, arg, info = 2, [step['text']], None
+        else:
+            if 'match' in step:
+                index = next((i for i, (text, _) in enumerate(rows) if step['match'] in text), len(rows))
+            else:
+                index = step.get('select', 0)
+                if isinstance(index, list):
+                    # No multi-select in script mode
+                    index = index[0] if index else len(rows)
+            if index < len(rows):
+                text, info = rows[index]
+                retv, arg = 1, [text]
+            else:
+                # Nothing to select, rofi closes as if cancelled
+                retv, arg, info = None, [], None
+        if 'key' in step and retv is not None:
+            for i in range(1, 20):
+                if option(argv, f'-kb-custom-{i}') == step['key']:
+                    retv = 9 + i
+                    break
+            else:
+                raise SystemExit(f"fake-rofi: no -kb-custom-N is bound to {step['key']}")
+        record['retv'] = retv
+        record['arg'] = arg
+        record['answered'] = elapsed()
+
+        if logpath:
+            with open(logpath, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        if retv is None:
+            return 1
+        env = dict(os.environ, ROFI_RETV=str(retv))
+        if info:
+            env['ROFI_INFO'] = info
+
+
+def main():
+    argv = sys.argv
+    logpath = os.environ.get('FAKE_ROFI_LOG')
+    if '-modi' in argv:
+        sys.exit(script_main(argv, logpath))
+    step = load_step(logpath)
+
+    record = {'argv': argv, 'pid': os.getpid(), 'started': started, 'step': step}
+    pre_read = int(option(argv, '-async-pre-read', 0))
+    rows = read_rows(record, pre_read, step.get('idle_ms', 500) / 1000)
+
+    time.sleep(step.get('delay_ms', 0) / 1000)
+    output, code = respond(argv, step, rows)
+    record['output'] = output
+    record['code'] = code
+    record['answered'] = elapsed()
+
+    if logpath:
+        with open(logpath, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    sys.stdout.write(output)
+    sys.stdout.flush()
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
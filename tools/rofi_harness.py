@@ -0,0 +1,183 @@
+"""
+End-to-end latency of the interactive path, without a display or a network.
+
+Runs toggl-rofi repeatedly against the fake API server and the fake rofi,
+each in a scratch configuration, and reports for every launch:
+    window: time from spawning toggl-rofi until rofi was exec'd
+    first_row: time until the first row reached rofi
+    pre_read: time until rofi had its -async-pre-read rows, i.e. the window would be drawn
+    rows: time until every row was written
+    exit: time until toggl-rofi exited, after acting on the response
+    switch: when the script goes through nested menus, the mean time from
+        answering one menu until the next had its rows
+along with the time in each phase of the launch trace, with --phases.
+The first launch has no snapshot to render from, the rest are warm.
+
+Usage: python tools/rofi_harness.py [--runs N] [--script PATH] [--latency MS] [--connect-latency MS] [--entries N] [--backend dmenu|script] [--phases] [--json PATH]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(TOOLS), 'src')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url).read()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def launch(env: dict, logpath: str, tracepath: str) -> dict:
+    """
+    Run toggl-rofi once, and return the timings of its first rofi launch.
+    """
+    with open(logpath) as f:
+        before = sum(1 for _ in f)
+    spawned = time.time()
+    subprocess.run(
+        [sys.executable, '-c', 'from toggl_rofi import run; run()'],
+        env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+    exited = time.time()
+    with open(logpath) as f:
+        records = [json.loads(line) for line in f][before:]
+    if not records:
+        raise RuntimeError("toggl-rofi never launched rofi")
+
+    record = records[0]
+    result = {
+        'launches': len(records),
+        'window': record['started'] - spawned,
+        'exit': exited - spawned,
+        'row_count': record['rows'],
+    }
+    with open(tracepath) as f:
+        result['phases'] = json.load(f)['totals']
+    switches = [
+        after['first_row_at'] - (before['started'] + before['answered'])
+        for before, after in zip(records, records[1:]) if 'first_row_at' in after
+    ]
+    if switches:
+        result['switch'] = sum(switches) / len(switches)
+    if 'first_row_at' in record:
+        offset = record['first_row_at'] - record['first_row']
+        result['first_row'] = record['first_row_at'] - spawned
+        result['rows'] = offset + record['read'] - spawned
+        if 'pre_read' in record:
+            result['pre_read'] = offset + record['pre_read'] - spawned
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="Warm launches after the first.")
+    parser.add_argument('--script', help="Fake rofi script, by default each launch selects the first row.")
+    parser.add_argument('--latency', type=float, default=50, help="Fake API latency in milliseconds.")
+    parser.add_argument(
+        '--connect-latency', type=float, default=0, help="Fake connection setup time in milliseconds."
+    )
+    parser.add_argument('--entries', type=int, default=2000, help="Entries in the fake account.")
+    parser.add_argument('--tasks', type=int, help="Distinct tasks the fake account's entries repeat.")
+    parser.add_argument('--projects', type=int, default=100, help="Projects in the fake account.")
+    parser.add_argument(
+        '--backend', choices=('dmenu', 'script'), default='dmenu', help="Rofi backend for toggl-rofi to use."
+    )
+    parser.add_argument('--phases', action='store_true', help="Print the time in each traced phase.")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON to this path, '-' for stdout.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='toggl-rofi-harness-') as tmp:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(TOOLS, 'fake_api.py'), '--port', str(port),
+             '--apikey', 'harness', '--latency', str(args.latency), '--connect-latency', str(args.connect_latency),
+             '--entries', str(args.entries), '--projects', str(args.projects),
+             *(('--tasks', str(args.tasks)) if args.tasks else ())],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for(f'http://127.0.0.1:{port}/_fake/stats')
+
+            configdir = os.path.join(tmp, 'config', 'togglpy')
+            os.makedirs(configdir)
+            with open(os.path.join(configdir, 'config.toml'), 'w') as f:
+                f.write(
+                    '[toggl]\n'
+                    'apikey = "harness"\n'
+                    f'api_base = "http://127.0.0.1:{port}/api/v9"\n'
+                    '[rofi]\n'
+                    f'executable = "{os.path.join(TOOLS, "fake_rofi.py")}"\n'
+                    f'backend = "{args.backend}"\n'
+                )
+            logpath = os.path.join(tmp, 'rofi.jsonl')
+            open(logpath, 'w').close()
+
+            env = dict(os.environ)
+            env.update({
+                'PYTHONPATH': os.pathsep.join(filter(None, (SRC, env.get('PYTHONPATH')))),
+                'XDG_CONFIG_HOME': os.path.join(tmp, 'config'),
+                'XDG_CACHE_HOME': os.path.join(tmp, 'cache'),
+                'XDG_DATA_HOME': os.path.join(tmp, 'data'),
+                # No daemon to hand over to
+                'XDG_RUNTIME_DIR': os.path.join(tmp, 'run'),
+                'FAKE_ROFI_LOG': logpath,
+            })
+            if args.script:
+                env['FAKE_ROFI_SCRIPT'] = os.path.abspath(args.script)
+
+            results = []
+            for i in range(args.runs + 1):
+                result = launch(env, logpath, os.path.join(tmp, 'cache', 'togglpy', 'trace.json'))
+                result['kind'] = 'cold' if i == 0 else 'warm'
+                results.append(result)
+                if args.json != '-':
+                    print(
+                        f"{result['kind']:<5}" + ''.join(
+                            f" {key} {result[key] * 1000:7.1f}ms"
+                            for key in ('window', 'first_row', 'pre_read', 'rows', 'switch', 'exit') if key in result
+                        ) + f" ({result['row_count']} rows, {result['launches']} menus)"
+                    )
+                    if args.phases:
+                        print('      ' + ''.join(
+                            f" {name} {elapsed * 1000:.1f}ms" for name, elapsed in result['phases'].items()
+                        ))
+
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_fake/stats') as resp:
+                requests = json.load(resp)
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json != '-':
+        print(f"{requests.get('total', 0)} API requests over {requests.get('connections', 0)} connections")
+    report = {'latency_ms': args.latency, 'entries': args.entries, 'launches': results, 'requests': requests}
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Synthetic Toggl accounts for benchmarks and the fake API server.
+
+Accounts are generated as v9 API data, so they can be merged into a LocalState
+or served as they are. Generation is seeded, so the same arguments always give
+the same account.
+"""
+import datetime as dt
+import itertools
+import random
+from typing import Optional
+
+
+# Mixed scripts, accents, emoji and pango markup characters,
+# to exercise escaping and width handling the way real descriptions do
+WORDS = [
+    'review', 'meeting', 'deploy', 'refactor', 'planning', 'support', 'reading', 'café',
+    'naïve', 'Überprüfung', 'résumé', 'задача', 'обзор', '会議', '設計', '開発', 'テスト',
+    'مراجعة', 'σχεδίαση', '🚀', '🐛', '☕', 'R&D', '<draft>', '"quoted"', "it's", 'a&b',
+]
+
+COLOURS = ['#06aaf5', '#c56bff', '#ea468d', '#fb8b14', '#c7741c', '#4dc3ff', '#bc85e6', '#566614']
+
+
+def iso(value: Optional[dt.datetime]) -> Optional[str]:
+    return value.isoformat().replace('+00:00', 'Z') if value is not None else None
+
+
+def make_description(rand: random.Random, words: int) -> str:
+    return ' '.join(rand.choice(WORDS) for _ in range(words))
+
+
+def make_account(projects: int = 100, tags: int = 50, entries: int = 1000, workspaces: int = 1,
+                 per_day: int = 20, description_words: int = 8, seed: int = 0,
+                 now: Optional[dt.datetime] = None, tasks: Optional[int] = None) -> dict:
+    """
+    Generate an account as API data, under the keys
+    'me', 'workspaces', 'projects', 'tags' and 'time_entries'.
+
+    Entries are spread back from `now` at `per_day` entries a day,
+    and the newest entry is left running.
+    With `tasks`, entries repeat that many distinct descriptions, projects and tags,
+    a few of them much more often than the rest, the way real histories do.
+    Otherwise every entry is different.
+    """
+    rand = random.Random(seed)
+    now = (now or dt.datetime.now(dt.timezone.utc)).replace(microsecond=0)
+    wids = [1000 + i for i in range(workspaces)]
+
+    me = {
+        'id': 1,
+        'email': 'bench@example.com',
+        'fullname': 'Bench Mark',
+        'timezone': 'Europe/London',
+        'default_workspace_id': wids[0],
+    }
+    workspace_data = [{'id': wid, 'name': f"Workspace {i}"} for i, wid in enumerate(wids)]
+    project_data = [
+        {
+            'id': 10_000 + i,
+            'workspace_id': wids[i % workspaces],
+            'client_id': None,
+            'name': f"{make_description(rand, 2)} {i}",
+            'color': rand.choice(COLOURS),
+            'active': True,
+            'at': iso(now),
+        }
+        for i in range(projects)
+    ]
+    tag_data = [
+        {'id': 20_000 + i, 'workspace_id': wids[i % workspaces], 'name': f"tag-{i}", 'at': iso(now)}
+        for i in range(tags)
+    ]
+
+    pool = []
+    if tasks:
+        for _ in range(tasks):
+            project = rand.choice(project_data) if project_data and rand.random() < 0.9 else None
+            entry_tags = rand.sample(tag_data, min(len(tag_data), rand.randint(0, 3)))
+            pool.append((project, entry_tags, make_description(rand, rand.randint(1, description_words))))
+        # Zipf-like, the nth task is used 1/n as often as the first
+        cum_weights = list(itertools.accumulate(1 / (n + 1) for n in range(tasks)))
+
+    entry_data = []
+    spacing = dt.timedelta(days=1) / per_day
+    for i in range(entries):
+        start = now - spacing * (entries - i)
+        running = i == entries - 1
+        stop = None if running else start + spacing * rand.uniform(0.2, 0.95)
+        if pool:
+            project, entry_tags, description = rand.choices(pool, cum_weights=cum_weights)[0]
+        else:
+            project = rand.choice(project_data) if project_data and rand.random() < 0.9 else None
+            entry_tags = rand.sample(tag_data, min(len(tag_data), rand.randint(0, 3)))
+            description = make_description(rand, rand.randint(1, description_words))
+        entry_data.append({
+            'id': 1_000_000 + i,
+            'workspace_id': project['workspace_id'] if project else wids[0],
+            'project_id': project['id'] if project else None,
+            'description': description,
+            'start': iso(start),
+            'stop': iso(stop),
+            'duration': -1 if running else int((stop - start).total_seconds()),
+            'tags': [tag['name'] for tag in entry_tags],
+            'tag_ids': [tag['id'] for tag in entry_tags],
+            'at': iso(stop or start),
+        })
+
+    return {
+        'me': me,
+        'workspaces': workspace_data,
+        'projects': project_data,
+        'tags': tag_data,
+        'time_entries': entry_data,
+    }